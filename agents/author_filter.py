@@ -0,0 +1,104 @@
+from typing import Any, Dict, FrozenSet, List, Sequence, Tuple
+
+import numpy as np
+from pydantic import BaseModel
+
+from agents.normalization import is_bot_name
+from mock_data import User
+
+# Comments an author needs in the selected subreddits to be considered at all
+MIN_COMMENTS = 3
+# Rhythm and length mix are only judged once there is enough history
+MIN_HISTORY = 10
+# Coefficient of variation of posting intervals; schedulers post like clockwork
+MIN_INTERVAL_CV = 0.2
+# Entropy (bits) of comment lengths in 20-character buckets; templates repeat one length
+MIN_LENGTH_ENTROPY = 0.5
+MAX_DUPLICATE_RATIO = 0.5
+# Mostly-distinguished authors are mod and admin accounts posting announcements
+MAX_DISTINGUISHED_RATE = 0.5
+MAX_CONTROVERSIALITY_RATE = 0.3
+MIN_ACCOUNT_AGE_DAYS = 30
+
+
+class AuthorFilterStats(BaseModel):
+    # An author failing several rules is counted under each of them
+    authors: int = 0
+    kept: int = 0
+    bot_names: int = 0
+    regular_intervals: int = 0
+    uniform_lengths: int = 0
+    duplicates: int = 0
+    distinguished: int = 0
+    controversial: int = 0
+    too_new: int = 0
+
+
+class AuthorVetting(BaseModel):
+    users: List[User]  # Most credible qualified authors, best first
+    rejected: FrozenSet[str] = frozenset()  # Authors failing a bot or quality rule
+    stats: AuthorFilterStats = AuthorFilterStats()
+
+
+class AuthorFeatures:
+    """
+    Per-author activity features as parallel numpy columns, one row per
+    author, as returned by author_activity_query.
+    """
+
+    def __init__(self, block: Dict[str, Sequence[Any]]):
+        self.authors: List[str] = list(block.get('author', []))
+
+        def column(name: str) -> np.ndarray:
+            # 64-bit integers arrive as JSON strings
+            return np.asarray(block.get(name, []), dtype=np.float64)
+
+        self.comments = column('comments')
+        self.domain_karma = column('domain_karma')
+        self.total_karma = column('total_karma')
+        self.interval_cv = column('interval_cv')
+        self.length_entropy = column('length_entropy')
+        self.duplicate_ratio = column('duplicate_ratio')
+        self.distinguished_rate = column('distinguished_rate')
+        self.controversiality_rate = column('controversiality_rate')
+        self.account_age_days = column('first_seen_days')
+
+    def __len__(self) -> int:
+        return len(self.authors)
+
+
+def bot_names(authors: Sequence[str]) -> np.ndarray:
+    """
+    True for known bot accounts and bot-like names, by the same rule as the
+    comment normalization.
+    """
+    return np.fromiter(map(is_bot_name, authors), dtype=bool, count=len(authors))
+
+
+def qualify_authors(
+    features: AuthorFeatures,
+) -> Tuple[np.ndarray, AuthorFilterStats]:
+    """
+    Boolean mask of the authors passing every bot and low-quality rule,
+    evaluated over all authors at once, and the per-rule rejection counts.
+    """
+    if not len(features):
+        return np.zeros(0, dtype=bool), AuthorFilterStats()
+
+    history = features.comments >= MIN_HISTORY
+    rules = {
+        'bot_names': bot_names(features.authors),
+        'regular_intervals': history & (features.interval_cv < MIN_INTERVAL_CV),
+        'uniform_lengths': history & (features.length_entropy < MIN_LENGTH_ENTROPY),
+        'duplicates': features.duplicate_ratio > MAX_DUPLICATE_RATIO,
+        'distinguished': features.distinguished_rate > MAX_DISTINGUISHED_RATE,
+        'controversial': features.controversiality_rate > MAX_CONTROVERSIALITY_RATE,
+        'too_new': features.account_age_days < MIN_ACCOUNT_AGE_DAYS,
+    }
+    rejected = np.logical_or.reduce(list(rules.values()))
+    stats = AuthorFilterStats(
+        authors=len(features),
+        kept=int((~rejected).sum()),
+        **{name: int(mask.sum()) for name, mask in rules.items()},
+    )
+    return ~rejected, stats
@@ -0,0 +1,213 @@
+import itertools
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Type, TypeVar
+
+from openai import LengthFinishReasonError, OpenAI
+from pydantic import BaseModel, ValidationError
+
+from agents.request_policy import (
+    MAX_WORKERS,
+    AttemptCancelled,
+    DeadlineExceeded,
+    RequestPolicy,
+    RequestRunner,
+)
+from agents.streaming import content_deltas, stream_items
+from agents.telemetry import Telemetry
+
+T = TypeVar('T', bound=BaseModel)
+
+LARGE_MODEL = 'gpt-4o-2024-08-06'
+SMALL_MODEL = 'gpt-4o-mini-2024-07-18'
+
+
+class StageModelConfig(BaseModel):
+    model: str = LARGE_MODEL
+    # In cascade mode `model` makes the first pass and only rejected results
+    # (schema-invalid or below min_confidence) are escalated to fallback_model
+    cascade: bool = False
+    fallback_model: str = LARGE_MODEL
+    min_confidence: float = 0.7
+
+
+# mine_features and prioritize_features send the same corpus prefix, but
+# prompt caches are per model, so with these tiers they do not share it
+DEFAULT_STAGE_MODELS: Dict[str, StageModelConfig] = {
+    'enrich_user': StageModelConfig(model=SMALL_MODEL, cascade=True),
+    'mine_features': StageModelConfig(),
+    'prioritize_features': StageModelConfig(model=SMALL_MODEL, cascade=True),
+    'validate_idea': StageModelConfig(),
+}
+
+
+def load_stage_models() -> Dict[str, StageModelConfig]:
+    """
+    Default tiers, overridable per stage from the environment, e.g.
+    MODEL_ENRICH_USER=gpt-4o-2024-08-06, CASCADE_ENRICH_USER=0.
+    """
+    configs = {}
+    for stage, default in DEFAULT_STAGE_MODELS.items():
+        suffix = stage.upper()
+        config = default.model_copy()
+        config.model = os.getenv(f'MODEL_{suffix}', config.model)
+        config.fallback_model = os.getenv(
+            f'FALLBACK_MODEL_{suffix}', config.fallback_model
+        )
+        if f'CASCADE_{suffix}' in os.environ:
+            config.cascade = os.environ[f'CASCADE_{suffix}'] not in ('', '0', 'false')
+        if f'MIN_CONFIDENCE_{suffix}' in os.environ:
+            config.min_confidence = float(os.environ[f'MIN_CONFIDENCE_{suffix}'])
+        configs[stage] = config
+    return configs
+
+
+class SchemaError(Exception):
+    pass
+
+
+# First-pass failures that justify escalating to the larger model
+ESCALATION_ERRORS = (SchemaError, ValidationError, LengthFinishReasonError)
+
+
+class LLMClient:
+    """
+    Structured-output calls routed to the model tier configured for each stage.
+    """
+
+    def __init__(
+        self,
+        telemetry: Optional[Telemetry] = None,
+        stage_models: Optional[Dict[str, StageModelConfig]] = None,
+        policy: Optional[RequestPolicy] = None,
+        max_workers: int = MAX_WORKERS,
+    ):
+        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        self.telemetry = telemetry or Telemetry()
+        self.stage_models = stage_models or load_stage_models()
+        self.runner = RequestRunner(self.telemetry, policy, max_workers)
+        # A hedge is the retry: SDK retries would run past the attempt's budget
+        self.attempts = (
+            self.client.with_options(max_retries=0)
+            if self.runner.policy.hedge
+            else self.client
+        )
+
+    def config(self, stage: str) -> StageModelConfig:
+        return self.stage_models.get(stage) or StageModelConfig()
+
+    def _parse_once(
+        self,
+        stage: str,
+        model: str,
+        messages: List[Dict[str, str]],
+        response_format: Type[T],
+    ) -> T:
+
+        def attempt(timeout: float, cancelled: threading.Event):
+            # Streamed under the hood so that a losing attempt can hang up
+            with self.attempts.beta.chat.completions.stream(
+                model=model,
+                messages=messages,
+                response_format=response_format,
+                stream_options={'include_usage': True},
+                timeout=timeout,
+            ) as stream:
+                for _ in stream:
+                    if cancelled.is_set():
+                        raise AttemptCancelled(stage)
+                return stream.get_final_completion()
+
+        completion = self.runner.run(stage, attempt)
+        self.telemetry.record_usage(stage, completion.usage, model)
+        message = completion.choices[0].message
+        if message.parsed is None:
+            raise SchemaError(message.refusal or 'No parsed output')
+        return message.parsed
+
+    def parse(
+        self,
+        stage: str,
+        messages: List[Dict[str, str]],
+        response_format: Type[T],
+        accept: Optional[Callable[[T, StageModelConfig], bool]] = None,
+    ) -> T:
+        """
+        Returns the parsed response. In cascade mode, a first-pass result that
+        fails to parse or is not accepted is redone on the fallback model.
+        """
+        config = self.config(stage)
+        if not config.cascade:
+            return self._parse_once(stage, config.model, messages, response_format)
+
+        try:
+            parsed = self._parse_once(stage, config.model, messages, response_format)
+            if accept is None or accept(parsed, config):
+                self.telemetry.record_cascade(stage, escalated=False)
+                return parsed
+        except ESCALATION_ERRORS as e:
+            print(f'Escalating {stage} to {config.fallback_model}: {e}')
+
+        self.telemetry.record_cascade(stage, escalated=True)
+        return self._parse_once(stage, config.fallback_model, messages, response_format)
+
+    def stream_items(
+        self,
+        stage: str,
+        messages: List[Dict[str, str]],
+        response_format: Type[BaseModel],
+        key: str,
+        item_model: Type[T],
+        model: Optional[str] = None,
+    ) -> Iterator[T]:
+        """
+        Streams the items of the `key` array of a structured response.
+        Cascading is left to the caller, which knows which items to redo.
+        Streams are bounded by the stage timeout and run deadline. Only stream
+        setup, up to the first token, is hedged: once items have been consumed
+        downstream, a duplicate could no longer replace the stream.
+        """
+        model = model or self.config(stage).model
+
+        def bounded(deltas: Iterator[str], ends_at: float) -> Iterator[str]:
+            for delta in deltas:
+                if time.monotonic() > ends_at:
+                    self.telemetry.record_timeout(stage)
+                    raise DeadlineExceeded(f'{stage} exceeded its budget')
+                yield delta
+
+        def open_stream(timeout: float, cancelled: threading.Event):
+            # The stream's budget runs from when this attempt started
+            ends_at = time.monotonic() + timeout
+            manager = self.attempts.beta.chat.completions.stream(
+                model=model,
+                messages=messages,
+                response_format=response_format,
+                stream_options={'include_usage': True},
+                timeout=timeout,
+            )
+            stream = manager.__enter__()
+            try:
+                deltas = content_deltas(stream)
+                first = next(deltas, None)
+                if cancelled.is_set():
+                    raise AttemptCancelled(stage)
+            except BaseException:
+                manager.__exit__(None, None, None)
+                raise
+            deltas = itertools.chain([first] if first else [], deltas)
+            return manager, stream, deltas, ends_at
+
+        manager, stream, deltas, ends_at = self.runner.run(
+            stage,
+            open_stream,
+            discard=lambda opened: opened[0].__exit__(None, None, None),
+        )
+        try:
+            yield from stream_items(bounded(deltas, ends_at), key, item_model)
+            self.telemetry.record_usage(
+                stage, stream.get_final_completion().usage, model
+            )
+        finally:
+            manager.__exit__(None, None, None)
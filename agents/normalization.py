@@ -0,0 +1,236 @@
+import html
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from pydantic import BaseModel
+
+from indexes.thread_index import QUOTE_MARKER, is_agreement
+from mock_data import Comment
+
+MIN_WORDS = 4
+BLOCK_SIZE = 500
+# Below this many comments, pool dispatch costs more than it saves; a full
+# mine (OPINION_LIMIT comments) is four blocks
+PARALLEL_MIN = 2 * BLOCK_SIZE
+LANGUAGES = frozenset({'en'})
+
+DELETED_TEXTS = frozenset({'[deleted]', '[removed]', '[ Removed by Reddit ]'})
+BOT_AUTHORS = frozenset(
+    {'automoderator', 'remindmebot', 'sneakpeekbot', 'wikisummarizerbot', 'b0trank'}
+)
+# "bot" as its own name part: "tldr_bot", "news-bot2", "SummaryBot", not "Talbot"
+BOT_NAME_RE = re.compile(r'(?i:(?:^|[_-])bot)\d*$|[a-z\d]Bot\d*$')
+BOT_TEXT_RE = re.compile(
+    r'\bI am a bot\b|this action was performed automatically|'
+    r'\bbeep,? boop\b|\^\(?I.?m a bot',
+    re.IGNORECASE,
+)
+
+CODE_BLOCK_RE = re.compile(r'```.*?```', re.DOTALL)
+QUOTE_BLOCK_RE = re.compile(r'(?:^[ \t]*(?:>|&gt;).*(?:\n|$))+', re.MULTILINE)
+LINK_RE = re.compile(r'!?\[([^\]]*)\]\([^)]*\)')
+URL_RE = re.compile(r'https?://\S+|www\.\S+')
+EMPHASIS_RE = re.compile(r'(\*{1,3}|_{2,3}|~~|`|\^)')
+HEADING_RE = re.compile(
+    r'^[ \t]*(?:#{1,6}[ \t]*|[-*+][ \t]+|\d+\.[ \t]+)', re.MULTILINE
+)
+TABLE_RE = re.compile(r'^[ \t]*\|?[ \t:]*-{3,}[ \t:|-]*$', re.MULTILINE)
+SPACE_RE = re.compile(r'[ \t\u200b\xa0]+')
+BLANK_LINES_RE = re.compile(r'\n\s*\n+')
+WORD_RE = re.compile(r'\w+')
+
+# Common function words per language; a comment is attributed to the
+# language whose words it uses most, when it uses at least two of them
+STOPWORD_PROFILES: Dict[str, FrozenSet[str]] = {
+    lang: frozenset(words.split())
+    for lang, words in {
+        'en': 'the and is to of it that you in for this with was but not have are'
+        ' i my me so just what if at be do know when how can they',
+        'es': 'el la de que y en los se del las por un una es no lo como pero para con',
+        'fr': 'le la les de et des est que un une pas pour dans ce qui je il sur avec',
+        'de': 'der die und das ist nicht ich zu den mit sie es ein eine auch auf für',
+        'pt': 'de que não o os as um uma para com é do da em mas eu se por',
+        'it': 'il di che la e non per un una sono del della è mi ma ho anche',
+    }.items()
+}
+
+
+class NormalizationStats(BaseModel):
+    comments: int = 0
+    kept: int = 0
+    deleted: int = 0
+    bots: int = 0
+    too_short: int = 0
+    other_language: int = 0
+    tokens_before: int = 0
+    tokens_after: int = 0
+    languages: Dict[str, int] = {}
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+    def merge(self, other: 'NormalizationStats') -> None:
+        for field in (
+            'comments',
+            'kept',
+            'deleted',
+            'bots',
+            'too_short',
+            'other_language',
+            'tokens_before',
+            'tokens_after',
+        ):
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+        for lang, count in other.languages.items():
+            self.languages[lang] = self.languages.get(lang, 0) + count
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough GPT token count (~4 characters per token for English).
+    """
+    return (len(text) + 3) // 4
+
+
+def detect_language(text: str) -> str:
+    """
+    ISO 639-1 code from function-word counts, or 'und' when undecided.
+    """
+    words = WORD_RE.findall(text.lower())
+    best, best_hits = 'und', 1
+    for lang, profile in STOPWORD_PROFILES.items():
+        hits = sum(w in profile for w in words)
+        if hits > best_hits:
+            best, best_hits = lang, hits
+    return best
+
+
+def clean_markdown(text: str) -> str:
+    """
+    Plain text from a Reddit markdown body: quoted parent text collapsed,
+    links reduced to their label, URLs, code blocks and formatting removed.
+    """
+    text = html.unescape(text)
+    text = CODE_BLOCK_RE.sub(' ', text)
+    text = QUOTE_BLOCK_RE.sub(QUOTE_MARKER + '\n', text)
+    text = LINK_RE.sub(r'\1', text)
+    text = URL_RE.sub('', text)
+    text = TABLE_RE.sub('', text)
+    text = HEADING_RE.sub('', text)
+    text = EMPHASIS_RE.sub('', text)
+    text = SPACE_RE.sub(' ', text)
+    return BLANK_LINES_RE.sub('\n', text).strip()
+
+
+def is_bot_name(author: str) -> bool:
+    return author.lower() in BOT_AUTHORS or bool(BOT_NAME_RE.search(author))
+
+
+def is_bot(author: str, text: str) -> bool:
+    return is_bot_name(author) or bool(BOT_TEXT_RE.search(text))
+
+
+def normalize_block(
+    block: Sequence[Tuple[str, str]],
+    min_words: int = MIN_WORDS,
+    languages: FrozenSet[str] = LANGUAGES,
+) -> Tuple[List[Optional[str]], NormalizationStats]:
+    """
+    Normalizes (author, text) pairs. Returns the cleaned text of each comment,
+    or None for dropped ones, and the block's stats.
+    """
+    stats = NormalizationStats(comments=len(block))
+    cleaned: List[Optional[str]] = []
+    for author, text in block:
+        stats.tokens_before += estimate_tokens(text)
+        if text.strip() in DELETED_TEXTS or author == '[deleted]':
+            stats.deleted += 1
+            cleaned.append(None)
+            continue
+        if is_bot(author, text):
+            stats.bots += 1
+            cleaned.append(None)
+            continue
+
+        body = clean_markdown(text)
+        without_quotes = body.replace(QUOTE_MARKER, ' ')
+        # Bare agreement replies are kept: they are folded into consensus
+        if len(without_quotes.split()) < min_words and not is_agreement(without_quotes):
+            stats.too_short += 1
+            cleaned.append(None)
+            continue
+
+        lang = detect_language(without_quotes)
+        stats.languages[lang] = stats.languages.get(lang, 0) + 1
+        if lang != 'und' and lang not in languages:
+            stats.other_language += 1
+            cleaned.append(None)
+            continue
+
+        stats.kept += 1
+        stats.tokens_after += estimate_tokens(body)
+        cleaned.append(body)
+    return cleaned, stats
+
+
+class Normalizer:
+    """
+    Normalizes mined comments in blocks across a process pool. The pool is
+    started on first use and reused, so a long-running process pays for it once.
+    """
+
+    def __init__(
+        self,
+        processes: Optional[int] = None,
+        block_size: int = BLOCK_SIZE,
+        min_words: int = MIN_WORDS,
+        languages: FrozenSet[str] = LANGUAGES,
+    ):
+        self.processes = processes or os.cpu_count() or 1
+        self.block_size = block_size
+        self.min_words = min_words
+        self.languages = languages
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _blocks(self, comments: Sequence[Comment]) -> List[List[Tuple[str, str]]]:
+        pairs = [(c.author, c.text) for c in comments]
+        return [
+            pairs[i : i + self.block_size]
+            for i in range(0, len(pairs), self.block_size)
+        ]
+
+    def normalize(
+        self, comments: Sequence[Comment]
+    ) -> Tuple[List[Comment], NormalizationStats]:
+        """
+        Returns the kept comments with normalized text, in input order.
+        """
+        blocks = self._blocks(comments)
+        args = ([self.min_words] * len(blocks), [self.languages] * len(blocks))
+        if self.processes > 1 and len(comments) >= PARALLEL_MIN:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(self.processes)
+            results = list(self._pool.map(normalize_block, blocks, *args))
+        else:
+            results = list(map(normalize_block, blocks, *args))
+
+        stats = NormalizationStats()
+        kept = []
+        texts = [text for cleaned, _ in results for text in cleaned]
+        for _, block_stats in results:
+            stats.merge(block_stats)
+        for comment, text in zip(comments, texts):
+            if text is not None:
+                kept.append(comment.model_copy(update={'text': text}))
+        return kept, stats
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
@@ -1,11 +1,25 @@
-import os
-from typing import List
+from typing import Dict, Iterator, List, Optional
 
-from openai import OpenAI
 from pydantic import BaseModel
 
-from mock_data import Comment, Feature, PMFReport, PrioritizedFeature, User
-from scoring.formulas import calculate_consensus_weight, calculate_pmf_score
+from agents.llm import ESCALATION_ERRORS, LLMClient, StageModelConfig
+from agents.prompting import CorpusBlock, CorpusCache, build_messages
+from agents.telemetry import Telemetry
+from indexes.thread_index import ThreadContext
+from mock_data import (
+    Comment,
+    ConsensusContribution,
+    Feature,
+    PMFReport,
+    PrioritizedFeature,
+    User,
+)
+from scoring.bootstrap import bootstrap_pmf_interval
+from scoring.formulas import (
+    UNKNOWN_CREDIBILITY,
+    calculate_consensus_weight,
+    calculate_pmf_score,
+)
 
 
 class FeatureAnalysis(BaseModel):
@@ -14,158 +28,292 @@ class FeatureAnalysis(BaseModel):
     sentiment_scores: List[float]  # Corresponds to related_comment_ids
     intensity_scores: List[float]  # Corresponds to related_comment_ids
     description: str  # Generated description
+    confidence: float  # Self-reported, 0.0 to 1.0; drives cascade escalation
 
 
 class FeatureAnalysisResponse(BaseModel):
     analyses: List[FeatureAnalysis]
 
 
-class ProductAnalystAgent:
-    def __init__(self):
-        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+class FeaturesResponse(BaseModel):
+    features: List[Feature]
 
-    def mine_features(
+
+def is_valid_analysis(analysis: FeatureAnalysis, config: StageModelConfig) -> bool:
+    n = len(analysis.related_comment_ids)
+    return (
+        len(analysis.sentiment_scores) == n
+        and len(analysis.intensity_scores) == n
+        and all(-1.0 <= s <= 1.0 for s in analysis.sentiment_scores)
+        and all(0.0 <= i <= 1.0 for i in analysis.intensity_scores)
+        and analysis.confidence >= config.min_confidence
+    )
+
+
+# Shared by every corpus-based stage. Prefix caches are per model, so only
+# calls on the same model reuse the cached prefix: with the default tiers,
+# mining and the escalated prioritization pass (set MODEL_PRIORITIZE_FEATURES
+# to the mining model to share it with the first pass too)
+ANALYST_INSTRUCTIONS = """
+You are an expert product manager and data analyst.
+You will receive a corpus of Reddit user comments, followed by a task about it.
+Each comment is listed as "ID: <id>, Text: <text>".
+Replies quote the comments they answer; "Agreed by N replies" means N more users backed that comment.
+Always refer to comments by their ID.
+"""
+
+
+class ProductAnalystAgent:
+    def __init__(
+        self, telemetry: Optional[Telemetry] = None, llm: Optional[LLMClient] = None
+    ):
+        self.llm = llm or LLMClient(telemetry)
+        self.telemetry = self.llm.telemetry
+        self.corpora = CorpusCache()
+
+    def iter_features(
         self, comments: List[Comment], project_description: str
-    ) -> List[Feature]:
+    ) -> Iterator[Feature]:
         """
-        Extracts potential features from comments.
+        Streams extracted features, yielding each one as soon as the model
+        has finished generating it.
+        In cascade mode the first pass is buffered and only released once the
+        whole response is known to be valid.
         """
-        comments_text = '\n'.join(f'ID: {c.id}, Text: {c.text}' for c in comments)
+        corpus = self.corpora.get(comments)
 
-        prompt = f"""
+        task = f"""
         Project Description: {project_description}
         
-        Analyze the following user comments and extract potential product features.
+        Analyze the user comments above and extract potential product features.
         Return a list of distinct features with a title and a category (e.g., Core, AI, UI/UX, Social, Integrations).
         Assign a unique ID to each feature (e.g., f1, f2...).
-        
-        Comments:
-        {comments_text}
         """
+        messages = build_messages(ANALYST_INSTRUCTIONS, corpus, task)
+        config = self.llm.config('mine_features')
 
-        class FeaturesResponse(BaseModel):
-            features: List[Feature]
+        def stream(model: str) -> Iterator[Feature]:
+            return self.llm.stream_items(
+                'mine_features', messages, FeaturesResponse, 'features', Feature, model
+            )
 
         try:
-            completion = self.client.beta.chat.completions.parse(
-                model='gpt-4o-2024-08-06',
-                messages=[
-                    {'role': 'system', 'content': 'You are an expert product manager.'},
-                    {'role': 'user', 'content': prompt},
-                ],
-                response_format=FeaturesResponse,
-            )
-            return completion.choices[0].message.parsed.features
+            if not config.cascade:
+                yield from stream(config.model)
+                return
+
+            try:
+                features = list(stream(config.model))
+                ids = [f.id for f in features]
+                escalate = not features or len(set(ids)) != len(ids)
+            except ESCALATION_ERRORS as e:
+                print(f'Escalating mine_features to {config.fallback_model}: {e}')
+                escalate = True
+
+            self.telemetry.record_cascade('mine_features', escalated=escalate)
+            if escalate:
+                yield from stream(config.fallback_model)
+            else:
+                yield from features
         except Exception as e:
             print(f'Error mining features: {e}')
-            return []
 
-    def prioritize_features(
-        self, features: List[Feature], comments: List[Comment], users: List[User]
-    ) -> List[PrioritizedFeature]:
+    def mine_features(
+        self, comments: List[Comment], project_description: str
+    ) -> List[Feature]:
         """
-        Prioritizes features based on Consensus Weight.
+        Extracts potential features from comments.
         """
-        if not features:
-            return []
-
-        comments_map = {c.id: c for c in comments}
-        users_map = {u.id: u for u in users}
+        return list(self.iter_features(comments, project_description))
 
-        comments_text = '\n'.join(f'ID: {c.id}, Text: {c.text}' for c in comments)
+    def _stream_analyses(
+        self, corpus: CorpusBlock, features: List[Feature], model: str
+    ) -> Iterator[FeatureAnalysis]:
         features_text = '\n'.join(
             f'ID: {f.id}, Title: {f.title}, Category: {f.category}' for f in features
         )
 
-        prompt = f"""
-        For each feature listed below, identify which of the provided comments are relevant to it.
+        task = f"""
+        For each feature listed below, identify which of the comments above are relevant to it.
         For each relevant comment, assign:
         1. Sentiment Score (-1.0 to 1.0): How positive/supportive is the comment regarding this feature?
         2. Intensity Score (0.0 to 1.0): How strongly does the comment imply the need for this feature?
         
-        Also, generate a detailed description for each feature based on the user needs.
+        Also, generate a detailed description for each feature based on the user needs,
+        and rate your confidence in the analysis of each feature (0.0 to 1.0).
         
         Features:
         {features_text}
-        
-        Comments:
-        {comments_text}
         """
 
-        try:
-            completion = self.client.beta.chat.completions.parse(
-                model='gpt-4o-2024-08-06',
-                messages=[
-                    {'role': 'system', 'content': 'You are an expert data analyst.'},
-                    {'role': 'user', 'content': prompt},
-                ],
-                response_format=FeatureAnalysisResponse,
-            )
-
-            analyses = completion.choices[0].message.parsed.analyses
+        return self.llm.stream_items(
+            'prioritize_features',
+            build_messages(ANALYST_INSTRUCTIONS, corpus, task),
+            FeatureAnalysisResponse,
+            'analyses',
+            FeatureAnalysis,
+            model,
+        )
 
-            prioritized = []
-            for analysis in analyses:
-                # Find the original feature object
-                feature_obj = next(
-                    (f for f in features if f.id == analysis.feature_id), None
-                )
-                if not feature_obj:
-                    continue
+    def iter_prioritized_features(
+        self, features: List[Feature], comments: List[Comment], users: List[User]
+    ) -> Iterator[PrioritizedFeature]:
+        """
+        Streams prioritized features in generation order: the consensus weight
+        of each feature is aggregated as soon as its analysis is complete.
+        In cascade mode, features whose first-pass analysis is missing, invalid
+        or low-confidence are re-analyzed together on the fallback model.
+        """
+        if not features:
+            return
 
-                consensus_weight = 0.0
-                valid_comments_count = 0
-                representative_comments = []
+        features_map = {f.id: f for f in features}
+        comments_map = {c.id: c for c in comments}
+        users_map = {u.id: u for u in users}
 
-                for i, comment_id in enumerate(analysis.related_comment_ids):
-                    if comment_id not in comments_map:
-                        continue
+        corpus = self.corpora.get(comments)
+        config = self.llm.config('prioritize_features')
+        pending = dict(features_map)
 
-                    comment = comments_map[comment_id]
-                    user = users_map.get(comment.author)
-                    credibility = (
-                        user.credibility if user else 50
-                    )  # Default 50 if not found
+        def aggregate(analyses: Iterator[FeatureAnalysis], check: bool):
+            for analysis in analyses:
+                if analysis.feature_id not in pending:
+                    continue
+                if check and not is_valid_analysis(analysis, config):
+                    continue
+                del pending[analysis.feature_id]
+                prioritized = self._aggregate_analysis(
+                    analysis, features_map, comments_map, users_map, corpus.threads
+                )
+                if prioritized:
+                    yield prioritized
 
-                    sentiment = analysis.sentiment_scores[i]
-                    intensity = analysis.intensity_scores[i]
+        try:
+            try:
+                yield from aggregate(
+                    self._stream_analyses(corpus, features, config.model),
+                    check=config.cascade,
+                )
+            except ESCALATION_ERRORS as e:
+                if not config.cascade:
+                    raise
+                print(f'Escalating prioritize_features to {config.fallback_model}: {e}')
+
+            if config.cascade:
+                self.telemetry.record_cascade(
+                    'prioritize_features', escalated=bool(pending)
+                )
+                if pending:
+                    yield from aggregate(
+                        self._stream_analyses(
+                            corpus, list(pending.values()), config.fallback_model
+                        ),
+                        check=False,
+                    )
+        except Exception as e:
+            print(f'Error prioritizing features: {e}')
 
-                    # Normalize credibility to 0-1 for calculation
-                    cred_norm = credibility / 100.0
+    def _aggregate_analysis(
+        self,
+        analysis: FeatureAnalysis,
+        features_map: Dict[str, Feature],
+        comments_map: Dict[str, Comment],
+        users_map: Dict[str, User],
+        threads: ThreadContext,
+    ) -> Optional[PrioritizedFeature]:
+        # Find the original feature object
+        feature_obj = features_map.get(analysis.feature_id)
+        if not feature_obj:
+            return None
+
+        consensus_weight = 0.0
+        valid_comments_count = 0
+        representative_comments = []
+        contributions = []
+
+        for i, comment_id in enumerate(analysis.related_comment_ids):
+            if comment_id not in comments_map:
+                continue
+
+            comment = comments_map[comment_id]
+            user = users_map.get(comment.author)
+            credibility = user.credibility if user else UNKNOWN_CREDIBILITY
+
+            sentiment = analysis.sentiment_scores[i]
+            intensity = analysis.intensity_scores[i]
+
+            # Normalize credibility to 0-1 for calculation
+            cred_norm = credibility / 100.0
+
+            # Use formula from scoring package
+            # Note: The formula returns Cu * S * I. We scale it up by 100 as per previous logic/demo values
+            weight = calculate_consensus_weight(cred_norm, sentiment, intensity) * 100
+
+            # A sampled comment counts for `weight` comments of the full corpus
+            consensus_weight += weight * comment.weight
+            valid_comments_count += comment.weight
+            representative_comments.append(comment)
+            contributions.append(
+                ConsensusContribution(
+                    commentId=comment_id,
+                    author=comment.author,
+                    credibility=cred_norm,
+                    sentiment=sentiment,
+                    intensity=intensity,
+                    weight=comment.weight,
+                )
+            )
 
-                    # Use formula from scoring package
-                    # Note: The formula returns Cu * S * I. We scale it up by 100 as per previous logic/demo values
-                    weight = (
-                        calculate_consensus_weight(cred_norm, sentiment, intensity)
-                        * 100
+            # Folded agreement replies inherit the parent's sentiment and intensity
+            for reply in threads.agreements.get(comment_id, []):
+                reply_user = users_map.get(reply.author)
+                reply_credibility = (
+                    reply_user.credibility if reply_user else UNKNOWN_CREDIBILITY
+                )
+                consensus_weight += (
+                    calculate_consensus_weight(
+                        reply_credibility / 100.0, sentiment, intensity
                     )
-
-                    consensus_weight += weight
-                    valid_comments_count += 1
-                    representative_comments.append(comment)
-
-                # Limit representative comments to top 3 (simple logic for now)
-                representative_comments = representative_comments[:3]
-
-                prioritized.append(
-                    PrioritizedFeature(
-                        id=feature_obj.id,
-                        title=feature_obj.title,
-                        category=feature_obj.category,
-                        linkedComments=valid_comments_count,
-                        consensusWeight=int(consensus_weight),
-                        description=analysis.description,
-                        representativeComments=representative_comments,
+                    * 100
+                    * reply.weight
+                )
+                valid_comments_count += reply.weight
+                contributions.append(
+                    ConsensusContribution(
+                        commentId=reply.id,
+                        author=reply.author,
+                        credibility=reply_credibility / 100.0,
+                        sentiment=sentiment,
+                        intensity=intensity,
+                        weight=reply.weight,
                     )
                 )
 
-            # Sort by consensus weight descending
-            prioritized.sort(key=lambda x: x.consensusWeight, reverse=True)
-            return prioritized
+        # Limit representative comments to top 3 (simple logic for now)
+        representative_comments = representative_comments[:3]
+
+        return PrioritizedFeature(
+            id=feature_obj.id,
+            title=feature_obj.title,
+            category=feature_obj.category,
+            linkedComments=round(valid_comments_count),
+            consensusWeight=int(consensus_weight),
+            description=analysis.description,
+            representativeComments=representative_comments,
+            contributions=contributions,
+        )
 
-        except Exception as e:
-            print(f'Error prioritizing features: {e}')
-            return []
+    def prioritize_features(
+        self, features: List[Feature], comments: List[Comment], users: List[User]
+    ) -> List[PrioritizedFeature]:
+        """
+        Prioritizes features based on Consensus Weight.
+        """
+        prioritized = list(self.iter_prioritized_features(features, comments, users))
+
+        # Sort by consensus weight descending
+        prioritized.sort(key=lambda x: x.consensusWeight, reverse=True)
+        return prioritized
 
     def validate_idea(
         self, prioritized_features: List[PrioritizedFeature], project_description: str
@@ -190,6 +338,22 @@ class ProductAnalystAgent:
         # Let's use the formula function.
         pmf_score = calculate_pmf_score(top_weights, total_volume)
 
+        # Resample each feature's comments to show how much the score hinges on them
+        contributions = [
+            [
+                calculate_consensus_weight(c.credibility, c.sentiment, c.intensity)
+                * 100
+                * c.weight
+                for c in f.contributions
+            ]
+            for f in prioritized_features
+        ]
+        score_low, score_high = (
+            bootstrap_pmf_interval(contributions, total_volume)
+            if any(contributions)
+            else (None, None)
+        )
+
         prompt = f"""
         Project Description: {project_description}
         
@@ -204,17 +368,19 @@ class ProductAnalystAgent:
         """
 
         try:
-            completion = self.client.beta.chat.completions.parse(
-                model='gpt-4o-2024-08-06',
-                messages=[
+            report = self.llm.parse(
+                'validate_idea',
+                [
                     {'role': 'system', 'content': 'You are a startup validator.'},
                     {'role': 'user', 'content': prompt},
                 ],
-                response_format=PMFReport,
+                PMFReport,
+                accept=lambda r, config: 5 <= len(r.summary) <= 7,
             )
             # Override the score with our calculated one to ensure consistency
-            report = completion.choices[0].message.parsed
             report.score = pmf_score
+            report.scoreLow = score_low
+            report.scoreHigh = score_high
             return report
         except Exception as e:
             print(f'Error validating idea: {e}')
@@ -0,0 +1,108 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, List, Optional, Set
+
+from pydantic import BaseModel
+
+from mock_data import Tag
+
+# New comments an author needs before a stored profile is refreshed
+MIN_NEW_COMMENTS = 3
+
+
+class StoredProfile(BaseModel):
+    author: str
+    tags: List[Tag]
+    commentIds: Set[str]  # Comments the tags were inferred from
+    updatedAt: float
+
+
+class ProfileStore:
+    """
+    User profiles persisted in SQLite, keyed by author, together with the ids
+    of the comments already profiled, so later runs only look at new activity.
+    Safe to share between threads and, through WAL, between processes.
+    """
+
+    def __init__(self, path: str, min_new_comments: int = MIN_NEW_COMMENTS):
+        self.path = path
+        self.min_new_comments = min_new_comments
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(
+            path, timeout=60, isolation_level=None, check_same_thread=False
+        )
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS profiles (
+                author TEXT PRIMARY KEY,
+                tags TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS profiled_comments (
+                author TEXT NOT NULL,
+                comment_id TEXT NOT NULL,
+                PRIMARY KEY (author, comment_id)
+            ) WITHOUT ROWID
+            """
+        )
+
+    @classmethod
+    def from_env(cls) -> Optional['ProfileStore']:
+        path = os.getenv('PROFILE_STORE_PATH')
+        return cls(path) if path else None
+
+    def get(self, author: str) -> Optional[StoredProfile]:
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT tags, updated_at FROM profiles WHERE author = ?', (author,)
+            ).fetchone()
+            if row is None:
+                return None
+            comment_ids = {
+                comment_id
+                for (comment_id,) in self.conn.execute(
+                    'SELECT comment_id FROM profiled_comments WHERE author = ?',
+                    (author,),
+                )
+            }
+        return StoredProfile(
+            author=author,
+            tags=[Tag.model_validate(t) for t in json.loads(row[0])],
+            commentIds=comment_ids,
+            updatedAt=row[1],
+        )
+
+    def save(self, author: str, tags: List[Tag], comment_ids: Iterable[str]) -> None:
+        """
+        Replaces the author's tags and adds comment_ids to their profiled set.
+        """
+        with self._lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                self.conn.execute(
+                    """
+                    INSERT INTO profiles (author, tags, updated_at) VALUES (?, ?, ?)
+                    ON CONFLICT (author) DO UPDATE
+                    SET tags = excluded.tags, updated_at = excluded.updated_at
+                    """,
+                    (author, json.dumps([t.model_dump() for t in tags]), time.time()),
+                )
+                self.conn.executemany(
+                    'INSERT OR IGNORE INTO profiled_comments (author, comment_id) VALUES (?, ?)',
+                    [(author, comment_id) for comment_id in comment_ids],
+                )
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+
+    def needs_refresh(self, profile: StoredProfile, new_comment_ids: Set[str]) -> bool:
+        return len(new_comment_ids - profile.commentIds) >= self.min_new_comments
@@ -1,61 +1,110 @@
-import os
-from typing import List
+from typing import List, Optional
 
-from openai import OpenAI
 from pydantic import BaseModel
 
+from agents.llm import LLMClient, StageModelConfig
+from agents.profile_store import ProfileStore
+from agents.telemetry import Telemetry
 from mock_data import Comment, Tag, User
 
 
 class TagsResponse(BaseModel):
     tags: List[str]
+    confidence: float  # Self-reported, 0.0 to 1.0; drives cascade escalation
+
+
+def accept_tags(response: TagsResponse, config: StageModelConfig) -> bool:
+    return bool(response.tags) and response.confidence >= config.min_confidence
 
 
 class ProfilerAgent:
-    def __init__(self):
-        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+    def __init__(
+        self,
+        telemetry: Optional[Telemetry] = None,
+        llm: Optional[LLMClient] = None,
+        store: Optional[ProfileStore] = None,
+    ):
+        self.llm = llm or LLMClient(telemetry)
+        self.telemetry = self.llm.telemetry
+        self.store = store or ProfileStore.from_env()
 
-    def enrich_user(self, user: User, comments: List[Comment]) -> User:
+    def enrich_user(
+        self, user: User, comments: List[Comment], raise_errors: bool = False
+    ) -> User:
         """
         Enriches the user with behavioral tags based on their comments.
         If user already has tags (mock data), returns as is.
+        With a profile store, a stored profile is reused until the author has
+        enough new comments, and is then updated from those comments only.
+        With raise_errors, LLM failures propagate instead of tagging the user
+        as unprofiled (worker mode retries the whole shard).
         """
         if user.tags:
             return user
 
-        user_comments = [c.text for c in comments if c.author == user.id]
+        user_comments = [c for c in comments if c.author == user.id]
+        stored = self.store.get(user.id) if self.store else None
 
-        if not user_comments:
+        if stored:
+            # Only comments not seen by the stored profile are sent, with its tags
+            new_comments = [c for c in user_comments if c.id not in stored.commentIds]
+            if not self.store.needs_refresh(stored, {c.id for c in new_comments}):
+                user.tags = stored.tags
+                return user
+            user_comments = new_comments
+        elif not user_comments:
             user.tags = [Tag(label='New User', color='gray')]
             return user
 
-        comments_text = '\n'.join(f'- {c}' for c in user_comments)
+        comments_text = '\n'.join(f'- {c.text}' for c in user_comments)
 
-        prompt = f"""
+        if stored:
+            previous = ', '.join(t.label for t in stored.tags)
+            prompt = f"""
+        This Reddit user was previously profiled with the tags: {previous}.
+        Update the profile using their new comments below: keep the tags that still apply and replace or add tags the new comments clearly support.
+        Return 2-4 short, descriptive tags in total.
+        Rate your confidence in this profile from 0.0 to 1.0.
+        
+        New comments:
+        {comments_text}
+        """
+        else:
+            prompt = f"""
         Analyze the following comments made by a Reddit user and infer their behavioral profile.
         Assign 2-4 short, descriptive tags that characterize them (e.g., "Tech Savvy", "Price Sensitive", "Early Adopter", "Skeptic", "Industry Expert", "Casual User").
+        Rate your confidence in this profile from 0.0 to 1.0.
         
         Comments:
         {comments_text}
         """
 
         try:
-            completion = self.client.beta.chat.completions.parse(
-                model='gpt-4o-2024-08-06',
-                messages=[
+            response = self.llm.parse(
+                'enrich_user',
+                [
                     {'role': 'system', 'content': 'You are an expert user profiler.'},
                     {'role': 'user', 'content': prompt},
                 ],
-                response_format=TagsResponse,
+                TagsResponse,
+                accept=accept_tags,
             )
 
-            tags_str = completion.choices[0].message.parsed.tags
+            tags_str = response.tags
             # Limit to 4 tags and ensure they are short
             # Assign random colors for generated tags
             user.tags = [Tag(label=t, color='blue') for t in tags_str[:4]]
 
+            if self.store:
+                self.store.save(user.id, user.tags, [c.id for c in user_comments])
+
         except Exception as e:
+            if raise_errors:
+                raise
             print(f'Error profiling user {user.id}: {e}')
-            user.tags = [Tag(label='Unprofiled', color='gray')]
+            # A stale stored profile beats none
+            user.tags = (
+                stored.tags if stored else [Tag(label='Unprofiled', color='gray')]
+            )
 
         return user
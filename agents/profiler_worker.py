@@ -0,0 +1,432 @@
+"""
+Sharded worker mode for ProfilerAgent.
+
+Authors are partitioned into shards by consistent hash. Shards go into a
+SQLite work queue on local disk (WAL mode is not safe on network file
+systems) that any number of worker processes on the host claim and complete
+independently. A failed or abandoned shard is retried on its own; finished
+shards are never redone. Results are merged back in input order, whatever
+order shards finish in.
+
+The pipeline uses this mode when PROFILE_QUEUE_DIR is set: each input gets its
+own queue file in that directory, keyed by a hash of the users, comments and
+shard count, so a rerun of the same input resumes and other inputs never
+reuse it. Runs of the same input may overlap: each holds a shared lock on
+the queue's lock file, and the last one to finish removes the queue. LLM
+usage is stored per shard attempt and run, and merged into the telemetry of
+the run that made the calls.
+
+Usage:
+    python -m agents.profiler_worker work --queue profiles.db --processes 8
+"""
+
+import argparse
+import bisect
+import fcntl
+import hashlib
+import json
+import multiprocessing
+import os
+import sqlite3
+import time
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from agents.profiler_agent import ProfilerAgent
+from agents.request_policy import call_with_deadline
+from agents.telemetry import StageUsage, Telemetry, run_telemetry
+from mock_data import Comment, User
+
+MAX_ATTEMPTS = 3
+LEASE_SECONDS = 600  # A running shard not finished within this is reclaimable
+POLL_SECONDS = 1.0  # How often idle workers check on shards running elsewhere
+VIRTUAL_NODES = 64
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """
+    Consistent hash ring: adding shards only moves ~1/N of the authors.
+    """
+
+    def __init__(self, shards: int, virtual_nodes: int = VIRTUAL_NODES):
+        points = sorted(
+            (_hash(f'shard-{shard}#{v}'), shard)
+            for shard in range(shards)
+            for v in range(virtual_nodes)
+        )
+        self.keys = [p for p, _ in points]
+        self.shards = [s for _, s in points]
+
+    def shard(self, author: str) -> int:
+        i = bisect.bisect(self.keys, _hash(author)) % len(self.keys)
+        return self.shards[i]
+
+
+def queue_key(users: List[User], comments: List[Comment], shards: int) -> str:
+    """
+    Hash identifying a profiling input: the same users, comments and shard
+    count always map to the same queue file.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(shards).encode())
+    for model in [*users, *comments]:
+        digest.update(model.model_dump_json().encode())
+    return digest.hexdigest()
+
+
+def partition(
+    users: List[User], comments: List[Comment], shards: int
+) -> Dict[int, Tuple[List[User], List[Comment]]]:
+    ring = HashRing(shards)
+    by_author: Dict[str, List[Comment]] = {}
+    for c in comments:
+        by_author.setdefault(c.author, []).append(c)
+
+    result: Dict[int, Tuple[List[User], List[Comment]]] = {}
+    for user in users:
+        shard_users, shard_comments = result.setdefault(ring.shard(user.id), ([], []))
+        shard_users.append(user)
+        shard_comments.extend(by_author.get(user.id, []))
+    return result
+
+
+class ProfileQueue:
+    """
+    Shard queue in a SQLite file (pending -> running -> done | failed).
+    """
+
+    def __init__(self, path: str, max_attempts: int = MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS shards (
+                id INTEGER PRIMARY KEY,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                payload TEXT NOT NULL,
+                result TEXT,
+                worker TEXT,
+                error TEXT,
+                updated_at REAL NOT NULL DEFAULT 0
+            )
+            """
+        )
+        # LLM usage of each shard attempt, by the run whose workers made it
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS shard_usage (
+                shard_id INTEGER NOT NULL,
+                run TEXT,
+                usage TEXT NOT NULL
+            )
+            """
+        )
+
+    def enqueue(self, shards: Dict[int, Tuple[List[User], List[Comment]]]) -> None:
+        """
+        Adds the shards not queued yet; safe to call from concurrent runs.
+        """
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            for shard_id, (users, comments) in sorted(shards.items()):
+                payload = json.dumps(
+                    {
+                        'users': [u.model_dump() for u in users],
+                        'comments': [c.model_dump() for c in comments],
+                    }
+                )
+                self.conn.execute(
+                    'INSERT OR IGNORE INTO shards (id, payload) VALUES (?, ?)',
+                    (shard_id, payload),
+                )
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+
+    def _expire_leases(self) -> None:
+        """
+        Abandoned shards that used up their attempts are failed, so that
+        status reports them and retry_failed picks them up.
+        """
+        self.conn.execute(
+            """
+            UPDATE shards
+            SET status = 'failed', error = 'Lease expired', updated_at = ?
+            WHERE status = 'running' AND updated_at < ? AND attempts >= ?
+            """,
+            (time.time(), time.time() - LEASE_SECONDS, self.max_attempts),
+        )
+
+    def claim(self, worker: str) -> Optional[Tuple[int, str]]:
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            self._expire_leases()
+            row = self.conn.execute(
+                """
+                SELECT id, payload FROM shards
+                WHERE attempts < ?
+                  AND (status = 'pending' OR (status = 'running' AND updated_at < ?))
+                ORDER BY attempts, id
+                LIMIT 1
+                """,
+                (self.max_attempts, time.time() - LEASE_SECONDS),
+            ).fetchone()
+            if row:
+                self.conn.execute(
+                    """
+                    UPDATE shards
+                    SET status = 'running', attempts = attempts + 1,
+                        worker = ?, updated_at = ?
+                    WHERE id = ?
+                    """,
+                    (worker, time.time(), row[0]),
+                )
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+        return row
+
+    def complete(self, shard_id: int, users: List[User]) -> None:
+        self.conn.execute(
+            """
+            UPDATE shards
+            SET status = 'done', result = ?, error = NULL, updated_at = ?
+            WHERE id = ?
+            """,
+            (json.dumps([u.model_dump() for u in users]), time.time(), shard_id),
+        )
+
+    def fail(self, shard_id: int, error: str) -> None:
+        self.conn.execute(
+            """
+            UPDATE shards
+            SET status = CASE WHEN attempts < ? THEN 'pending' ELSE 'failed' END,
+                error = ?, updated_at = ?
+            WHERE id = ?
+            """,
+            (self.max_attempts, error, time.time(), shard_id),
+        )
+
+    def record_usage(
+        self, shard_id: int, run: Optional[str], telemetry: Telemetry
+    ) -> None:
+        if not telemetry.stages:
+            return
+        usage = {stage: stats.model_dump() for stage, stats in telemetry.stages.items()}
+        self.conn.execute(
+            'INSERT INTO shard_usage (shard_id, run, usage) VALUES (?, ?, ?)',
+            (shard_id, run, json.dumps(usage)),
+        )
+
+    def run_usage(self, run: str) -> List[Dict[str, StageUsage]]:
+        return [
+            {
+                stage: StageUsage.model_validate(stats)
+                for stage, stats in json.loads(usage).items()
+            }
+            for (usage,) in self.conn.execute(
+                'SELECT usage FROM shard_usage WHERE run = ?', (run,)
+            )
+        ]
+
+    def retry_failed(self) -> int:
+        """
+        Gives failed shards a fresh set of attempts; done shards are untouched.
+        """
+        self._expire_leases()
+        return self.conn.execute(
+            "UPDATE shards SET status = 'pending', attempts = 0 WHERE status = 'failed'"
+        ).rowcount
+
+    def counts(self) -> Dict[str, int]:
+        self._expire_leases()
+        return dict(
+            self.conn.execute('SELECT status, COUNT(*) FROM shards GROUP BY status')
+        )
+
+    def results(self) -> Dict[str, User]:
+        profiled = {}
+        for (result,) in self.conn.execute(
+            "SELECT result FROM shards WHERE status = 'done' ORDER BY id"
+        ):
+            for data in json.loads(result):
+                user = User.model_validate(data)
+                profiled[user.id] = user
+        return profiled
+
+
+def run_worker(
+    queue_path: str,
+    worker: Optional[str] = None,
+    timeout: Optional[float] = None,
+    run: Optional[str] = None,
+) -> int:
+    """
+    Claims and profiles shards until none are left. Returns shards completed.
+    With a timeout, LLM calls are bounded by what is left of it, as in a
+    pipeline run with a deadline. The LLM usage of each attempt is stored
+    under run, for that run to report. Shards still running in other workers
+    are waited for, since their lease may expire and make them claimable.
+    """
+    load_dotenv()
+    worker = worker or f'{os.uname().nodename}:{os.getpid()}'
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    queue = ProfileQueue(queue_path)
+    profiler = ProfilerAgent()
+    completed = 0
+
+    while True:
+        claimed = queue.claim(worker)
+        if claimed is None:
+            expired = deadline is not None and time.monotonic() >= deadline
+            if expired or not queue.counts().get('running'):
+                break
+            time.sleep(POLL_SECONDS)
+            continue
+        shard_id, payload = claimed
+        usage = Telemetry()
+        token = run_telemetry.set(usage)
+        try:
+            data = json.loads(payload)
+            comments = [Comment.model_validate(c) for c in data['comments']]
+            users = [
+                call_with_deadline(
+                    deadline,
+                    profiler.enrich_user,
+                    User.model_validate(u),
+                    comments,
+                    True,
+                )
+                for u in data['users']
+            ]
+            queue.complete(shard_id, users)
+            completed += 1
+        except Exception:
+            queue.fail(shard_id, traceback.format_exc(limit=3))
+        finally:
+            run_telemetry.reset(token)
+            queue.record_usage(shard_id, run, usage)
+    return completed
+
+
+def _hold_queue(lock_path: str) -> int:
+    """
+    Takes a shared lock on the queue's lock file, retrying when the file was
+    removed by a finishing run in the meantime. Returns its descriptor.
+    """
+    while True:
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT)
+        fcntl.flock(fd, fcntl.LOCK_SH)
+        try:
+            if os.fstat(fd).st_ino == os.stat(lock_path).st_ino:
+                return fd
+        except FileNotFoundError:
+            pass
+        os.close(fd)
+
+
+def _release_queue(lock_fd: int, queue_path: str, remove: bool) -> None:
+    """
+    Releases the run's hold on the queue. With remove, the queue files are
+    deleted if no other run holds the queue.
+    """
+    try:
+        if remove:
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            for suffix in ('', '-wal', '-shm', '.lock'):
+                if os.path.exists(queue_path + suffix):
+                    os.remove(queue_path + suffix)
+    finally:
+        os.close(lock_fd)
+
+
+def profile_sharded(
+    users: List[User],
+    comments: List[Comment],
+    queue_dir: str,
+    processes: int = os.cpu_count() or 1,
+    shards: Optional[int] = None,
+    timeout: Optional[float] = None,
+    telemetry: Optional[Telemetry] = None,
+) -> List[User]:
+    """
+    Profiles users across a local process pool and returns them in input order.
+    The queue file is keyed by the input, so re-running with the same users
+    and comments resumes (only unfinished shards run); it is removed once
+    every shard is done and no other run holds it. The LLM usage of this
+    run's workers is merged into telemetry.
+    """
+    shards = shards or processes * 8
+    os.makedirs(queue_dir, exist_ok=True)
+    queue_path = os.path.join(queue_dir, f'{queue_key(users, comments, shards)}.db')
+    run = uuid.uuid4().hex
+    lock_fd = _hold_queue(queue_path + '.lock')
+    complete = False
+    try:
+        queue = ProfileQueue(queue_path)
+        queue.enqueue(partition(users, comments, shards))
+
+        # Forked workers would inherit the SQLite lock state of queues other
+        # runs in this process hold open, and could wait on them forever
+        with ProcessPoolExecutor(
+            processes, mp_context=multiprocessing.get_context('forkserver')
+        ) as pool:
+            workers = [
+                pool.submit(run_worker, queue_path, None, timeout, run)
+                for _ in range(processes)
+            ]
+            for future in workers:
+                future.result()
+
+        counts = queue.counts()
+        profiled = queue.results()
+        if telemetry is not None:
+            for usage in queue.run_usage(run):
+                telemetry.merge(usage)
+        queue.conn.close()
+        complete = not (
+            counts.get('failed') or counts.get('pending') or counts.get('running')
+        )
+        if not complete:
+            print(f'Profiling incomplete, shard status: {counts}')
+    finally:
+        _release_queue(lock_fd, queue_path, complete)
+
+    return [profiled.get(u.id, u) for u in users]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='Sharded ProfilerAgent worker')
+    parser.add_argument('command', choices=['work', 'status', 'retry'])
+    parser.add_argument('--queue', required=True)
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    if args.command == 'status':
+        print(ProfileQueue(args.queue).counts())
+    elif args.command == 'retry':
+        print(f'Requeued {ProfileQueue(args.queue).retry_failed()} failed shards')
+    else:
+        with ProcessPoolExecutor(args.processes) as pool:
+            done = sum(pool.map(run_worker, [args.queue] * args.processes))
+        print(f'Completed {done} shards')
+
+
+if __name__ == '__main__':
+    main()
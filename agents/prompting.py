@@ -0,0 +1,66 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Sequence, Tuple
+
+from indexes.thread_index import ThreadContext
+from mock_data import Comment
+
+CORPUS_CACHE_SIZE = 8
+
+
+class CorpusBlock:
+    """
+    A comment corpus serialized once and reused verbatim by every prompt that
+    needs it, so repeated calls over the same corpus share a byte-identical
+    prefix the provider can serve from its prompt cache.
+    """
+
+    def __init__(self, comments: Sequence[Comment]):
+        self.comments = list(comments)
+        self.threads = ThreadContext(self.comments)
+        self.text = f'Comments:\n{self.threads.render_all()}'
+
+
+class CorpusCache:
+    """
+    Small LRU of rendered corpora keyed by comment identity and content,
+    shared by the analyst's worker threads.
+    """
+
+    def __init__(self, size: int = CORPUS_CACHE_SIZE):
+        self.size = size
+        self._blocks: OrderedDict[Tuple, CorpusBlock] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, comments: Sequence[Comment]) -> CorpusBlock:
+        key = tuple((c.id, c.parentId, c.text) for c in comments)
+        with self._lock:
+            block = self._blocks.get(key)
+            if block is not None:
+                self._blocks.move_to_end(key)
+                return block
+        # Rendered outside the lock; a concurrent miss renders the same text
+        block = CorpusBlock(comments)
+        with self._lock:
+            block = self._blocks.setdefault(key, block)
+            self._blocks.move_to_end(key)
+            if len(self._blocks) > self.size:
+                self._blocks.popitem(last=False)
+        return block
+
+
+def build_messages(
+    static_instructions: str, corpus: CorpusBlock, task: str
+) -> List[Dict[str, str]]:
+    """
+    Lays out a prompt as: static instructions -> corpus -> per-call task.
+    Everything up to the end of the corpus is identical across calls (and
+    across stages sharing the same static instructions), which is what
+    provider-side prefix caching keys on. The cache is per model: only calls
+    to the same model are served from it.
+    """
+    return [
+        {'role': 'system', 'content': static_instructions},
+        {'role': 'user', 'content': corpus.text},
+        {'role': 'user', 'content': task},
+    ]
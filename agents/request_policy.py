@@ -0,0 +1,247 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, TypeVar
+
+from pydantic import BaseModel
+
+from agents.telemetry import Telemetry
+
+R = TypeVar('R')
+
+DEFAULT_STAGE_TIMEOUTS: Dict[str, float] = {
+    'enrich_user': 30.0,
+    'mine_features': 120.0,
+    'prioritize_features': 180.0,
+    'validate_idea': 60.0,
+}
+# Attempts in flight at once per runner; a call has at most two (with a hedge)
+MAX_WORKERS = 32
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class AttemptCancelled(Exception):
+    """
+    Raised by an attempt that noticed it lost a hedge race.
+    """
+
+
+# Absolute time.monotonic() by which the current validation run must finish
+_run_deadline: ContextVar[Optional[float]] = ContextVar('run_deadline', default=None)
+
+
+def call_with_deadline(
+    deadline: Optional[float], fn: Callable[..., R], *args: Any
+) -> R:
+    """
+    Runs fn with the run deadline set (for use inside worker threads).
+    """
+    token = _run_deadline.set(deadline)
+    try:
+        return fn(*args)
+    finally:
+        _run_deadline.reset(token)
+
+
+def iter_with_deadline(
+    deadline: Optional[float], factory: Callable[..., Iterator[R]], *args: Any
+) -> Iterator[R]:
+    token = _run_deadline.set(deadline)
+    try:
+        yield from factory(*args)
+    finally:
+        _run_deadline.reset(token)
+
+
+def remaining_time() -> Optional[float]:
+    deadline = _run_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+class RequestPolicy(BaseModel):
+    stage_timeouts: Dict[str, float] = DEFAULT_STAGE_TIMEOUTS
+    default_timeout: float = 120.0
+    hedge: bool = True
+    # Hedging waits for enough samples to trust the observed p95
+    hedge_min_samples: int = 20
+    hedge_quantile: float = 0.95
+
+    def timeout(self, stage: str) -> float:
+        return float(
+            os.getenv(
+                f'TIMEOUT_{stage.upper()}',
+                self.stage_timeouts.get(stage, self.default_timeout),
+            )
+        )
+
+
+class LatencyTracker:
+    """
+    Sliding window of successful call latencies per stage.
+    """
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(stage, deque(maxlen=self.window)).append(seconds)
+
+    def quantile(self, stage: str, q: float, min_samples: int) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(stage, ()))
+        if len(samples) < min_samples:
+            return None
+        return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+
+class RequestRunner:
+    """
+    Applies per-stage timeouts, the run deadline and hedging to blocking calls.
+    A call that outlives the stage's observed p95 latency gets one duplicate;
+    the first successful response wins. The other is cancelled if it has not
+    started; if it has, its `cancelled` event is set so it can hang up (and
+    free its executor thread), and any result it still returns is discarded.
+    Budgets run from when an attempt starts, so time spent queued behind
+    other calls is only bounded by the run deadline. Size max_workers to
+    twice the threads that make calls, so attempts rarely queue at all.
+    """
+
+    def __init__(
+        self,
+        telemetry: Telemetry,
+        policy: Optional[RequestPolicy] = None,
+        max_workers: int = MAX_WORKERS,
+    ):
+        self.telemetry = telemetry
+        self.policy = policy or RequestPolicy()
+        self.latency = LatencyTracker()
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix='llm')
+
+    def budget(self, stage: str) -> float:
+        """
+        Seconds a call of this stage may take: its timeout, capped by the run deadline.
+        """
+        timeout = self.policy.timeout(stage)
+        remaining = remaining_time()
+        if remaining is not None:
+            if remaining <= 0:
+                self.telemetry.record_timeout(stage)
+                raise DeadlineExceeded(f'Run deadline exceeded before {stage}')
+            timeout = min(timeout, remaining)
+        return timeout
+
+    def run(
+        self,
+        stage: str,
+        call: Callable[[float, threading.Event], R],
+        hedge: bool = True,
+        discard: Optional[Callable[[R], None]] = None,
+    ) -> R:
+        """
+        Runs call(timeout, cancelled) under the stage policy. Attempts should
+        stop early once `cancelled` is set; discard(result) releases the result
+        of an attempt that finished after losing (e.g. closes an open stream).
+        """
+        timeout = self.budget(stage)
+        run_deadline = _run_deadline.get()
+        hedge_after = (
+            self.latency.quantile(
+                stage, self.policy.hedge_quantile, self.policy.hedge_min_samples
+            )
+            if hedge and self.policy.hedge
+            else None
+        )
+
+        cancelled: Dict[Future, threading.Event] = {}
+        # Resolves with the time the first attempt left the executor queue
+        started: Future = Future()
+        # When each started attempt runs out of budget
+        ends: List[float] = []
+
+        def attempt(event: threading.Event) -> R:
+            now = time.monotonic()
+            budget = timeout
+            if run_deadline is not None:
+                budget = min(budget, run_deadline - now)
+            ends.append(now + budget)
+            if not started.done():
+                started.set_result(now)
+            if budget <= 0:
+                raise DeadlineExceeded(f'Run deadline exceeded before {stage}')
+            return call(budget, event)
+
+        def submit() -> Future:
+            event = threading.Event()
+            future = self._executor.submit(attempt, event)
+            cancelled[future] = event
+            return future
+
+        def abandon(losers: List[Future]) -> None:
+            for loser in losers:
+                cancelled[loser].set()
+                if not loser.cancel() and discard is not None:
+                    loser.add_done_callback(
+                        lambda f: f.exception() is None and discard(f.result())
+                    )
+
+        futures: List[Future] = [submit()]
+        hedged = False
+        error: Optional[BaseException] = None
+
+        while futures:
+            now = time.monotonic()
+            if started.done():
+                elapsed = now - started.result()
+                if now >= max(ends):
+                    break
+                wait_for = max(ends) - now
+                if hedge_after is not None and not hedged:
+                    wait_for = min(wait_for, max(hedge_after - elapsed, 0.0))
+                waiting = futures
+            else:
+                # Still queued: only the run deadline applies
+                if run_deadline is not None and now >= run_deadline:
+                    break
+                wait_for = None if run_deadline is None else run_deadline - now
+                waiting = [*futures, started]
+
+            done, _ = wait(waiting, timeout=wait_for, return_when=FIRST_COMPLETED)
+            done.discard(started)
+
+            if not done:
+                if (
+                    started.done()
+                    and hedge_after is not None
+                    and not hedged
+                    and time.monotonic() - started.result() >= hedge_after
+                ):
+                    hedged = True
+                    self.telemetry.record_hedge(stage)
+                    futures.append(submit())
+                continue
+
+            for future in done:
+                futures.remove(future)
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+                abandon(futures)
+                self.latency.record(stage, time.monotonic() - started.result())
+                return future.result()
+
+        abandon(futures)
+        if error is not None and not futures:
+            if isinstance(error, DeadlineExceeded):
+                self.telemetry.record_timeout(stage)
+            raise error
+        self.telemetry.record_timeout(stage)
+        raise DeadlineExceeded(f'{stage} exceeded its {timeout:.1f}s budget')
@@ -0,0 +1,142 @@
+import heapq
+import random
+from bisect import bisect_right
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from mock_data import Comment, User
+from scoring.formulas import UNKNOWN_CREDIBILITY
+
+# Most comments passed on to profiling and the analyst stages per validation
+SAMPLE_SIZE = 300
+# Band edges: user credibility (0-100) and comment score
+CREDIBILITY_BANDS = (40, 70)
+SCORE_BANDS = (1, 10, 100)
+
+
+def allocate(counts: Sequence[int], size: int) -> np.ndarray:
+    """
+    Sample size per stratum: proportional to its count (largest remainder),
+    with at least one comment per non-empty stratum. Raises ValueError when
+    there are more non-empty strata than the budget; merge them first.
+    """
+    n = np.asarray(counts, dtype=np.int64)
+    if n.sum() <= size:
+        return n
+    floor = np.minimum(n, 1)
+    if floor.sum() > size:
+        raise ValueError(f'{int(floor.sum())} non-empty strata for {size} comments')
+    share = (n - floor) * (size - floor.sum()) / (n - floor).sum()
+    result = floor + np.floor(share).astype(np.int64)
+    # The fractional part is only positive below n, so the extra one always fits
+    extra = np.argsort(-(share - np.floor(share)), kind='stable')
+    result[extra[: size - result.sum()]] += 1
+    return result
+
+
+class StratifiedSampler:
+    """
+    Bounded stratified sample of a comment stream, by subreddit, author
+    credibility band and comment score band, drawn in one pass.
+
+    Each comment gets a uniform random key and each stratum keeps the
+    sample_size smallest keys seen (a reservoir); after the pass the budget
+    is split across strata and each takes its smallest keys, a uniform sample
+    of that stratum. When there are more strata than the budget, score bands,
+    then credibility bands, then subreddits are merged, so every stratum gets
+    at least one comment. Sampled comments have their weight multiplied by
+    stratum count / stratum sample size, the inverse of their inclusion
+    probability here; with stream weights from an earlier random selection,
+    weighted sums over the sample estimate sums over everything it was drawn
+    from.
+    """
+
+    def __init__(
+        self,
+        sample_size: int = SAMPLE_SIZE,
+        credibility_bands: Sequence[int] = CREDIBILITY_BANDS,
+        score_bands: Sequence[int] = SCORE_BANDS,
+        seed: Optional[int] = None,
+    ):
+        self.sample_size = sample_size
+        self.credibility_bands = credibility_bands
+        self.score_bands = score_bands
+        self.seed = seed
+
+    def stratum(self, comment: Comment, credibility: int) -> Hashable:
+        return (
+            comment.subreddit,
+            bisect_right(self.credibility_bands, credibility),
+            bisect_right(self.score_bands, comment.score),
+        )
+
+    def merge(
+        self,
+        seen: Dict[Hashable, int],
+        reservoirs: Dict[Hashable, List[Tuple[float, int, Comment]]],
+        depth: int,
+    ) -> Tuple[Dict[Hashable, int], Dict[Hashable, List[Tuple[float, int, Comment]]]]:
+        """
+        Merges the strata sharing the first depth parts of their key. A merged
+        reservoir keeps the sample_size smallest keys of its parts, so it is
+        still a uniform sample of the merged stratum.
+        """
+        merged_seen: Dict[Hashable, int] = {}
+        parts: Dict[Hashable, List[Tuple[float, int, Comment]]] = {}
+        for key, count in seen.items():
+            coarse = key[:depth]
+            merged_seen[coarse] = merged_seen.get(coarse, 0) + count
+            parts.setdefault(coarse, []).extend(reservoirs[key])
+        merged = {
+            key: heapq.nlargest(self.sample_size, entries)
+            for key, entries in parts.items()
+        }
+        return merged_seen, merged
+
+    def sample(
+        self, comments: Iterable[Comment], users: Sequence[User]
+    ) -> List[Comment]:
+        """
+        Returns the sampled comments with their weights, in stream order.
+        When the stream fits the budget, every comment is returned as is.
+        """
+        rng = random.Random(self.seed)
+        credibility = {u.id: u.credibility for u in users}
+        # Per stratum: comments seen, and a max-heap of (-key, position, comment)
+        seen: Dict[Hashable, int] = {}
+        reservoirs: Dict[Hashable, List[Tuple[float, int, Comment]]] = {}
+
+        for position, comment in enumerate(comments):
+            key = self.stratum(
+                comment, credibility.get(comment.author, UNKNOWN_CREDIBILITY)
+            )
+            seen[key] = seen.get(key, 0) + 1
+            reservoir = reservoirs.setdefault(key, [])
+            entry = (-rng.random(), position, comment)
+            if len(reservoir) < self.sample_size:
+                heapq.heappush(reservoir, entry)
+            elif entry[0] > reservoir[0][0]:
+                heapq.heapreplace(reservoir, entry)
+
+        if sum(seen.values()) <= self.sample_size:
+            entries = [e for reservoir in reservoirs.values() for e in reservoir]
+            return [comment for _, _, comment in sorted(entries, key=lambda e: e[1])]
+
+        depth = len(next(iter(seen)))
+        while len(seen) > self.sample_size:
+            depth -= 1
+            seen, reservoirs = self.merge(seen, reservoirs, depth)
+
+        strata = list(seen)
+        sizes = allocate([seen[key] for key in strata], self.sample_size)
+        picked = []
+        for key, size in zip(strata, sizes):
+            if not size:
+                continue
+            factor = seen[key] / int(size)
+            for _, position, comment in heapq.nlargest(size, reservoirs[key]):
+                weight = comment.weight * factor
+                picked.append((position, comment.model_copy(update={'weight': weight})))
+        picked.sort(key=lambda p: p[0])
+        return [comment for _, comment in picked]
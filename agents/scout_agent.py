@@ -1,5 +1,30 @@
-from typing import List
+import math
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
 
+import numpy as np
+
+from agents.author_filter import (
+    MIN_COMMENTS,
+    AuthorFeatures,
+    AuthorFilterStats,
+    AuthorVetting,
+    qualify_authors,
+)
+from db.clickhouse import ClickHouseClient
+from db.queries import (
+    agreement_replies_query,
+    author_activity_query,
+    keyword_volume_query,
+    opinion_comments_query,
+    subreddit_activity_query,
+    subreddit_candidates_query,
+    subreddit_topics_query,
+)
+from indexes.bm25 import rank_comments, tokenize
 from mock_data import (
     MOCK_COMMENTS,
     MOCK_SUBREDDITS,
@@ -8,31 +33,340 @@ from mock_data import (
     Subreddit,
     User,
 )
+from scoring.formulas import relevance_zone
+from scoring.vectorized import calculate_subreddit_relevance, calculate_user_credibility
+
+# Daily stats only change when a day's data lands, so they can be reused
+STATS_TTL = 600.0
+# Communities scored per validation, and the topic similarity they need
+CANDIDATE_SUBREDDITS = 200
+MIN_SIMILARITY = 0.05
+# Communities selected for mining
+SUBREDDIT_LIMIT = 10
+# Credible authors kept per validation
+USER_LIMIT = 200
+# Candidates fetched from ClickHouse
+OPINION_LIMIT = 2000
+OPINION_DAYS = 365
+# Share of threads read by the exploratory volume estimate
+EXPLORE_SAMPLE = 0.1
+# Matching comments to scan per comment kept, before sampling kicks in
+OVERSAMPLE = 5
+
+
+def opinion_keywords(text: str, max_keywords: int = 8) -> List[str]:
+    """
+    Most frequent description terms long enough for the n-gram skip index.
+    """
+    counts = Counter(t for t in tokenize(text) if len(t) >= 4)
+    return [t for t, _ in counts.most_common(max_keywords)]
+
+
+def topic_similarity(query: str, topic_texts: List[str]) -> np.ndarray:
+    """
+    Cosine similarity between the query and each topic text (bag of words).
+    Only the query vocabulary contributes to the dot product, so each topic
+    is reduced to its counts over those terms plus its own vector norm.
+    """
+    query_counts = Counter(tokenize(query))
+    if not query_counts or not topic_texts:
+        return np.zeros(len(topic_texts))
+
+    vocabulary = list(query_counts)
+    query_vector = np.array([query_counts[t] for t in vocabulary], dtype=np.float64)
+
+    overlap = np.zeros((len(topic_texts), len(vocabulary)))
+    norms = np.zeros(len(topic_texts))
+    for i, text in enumerate(topic_texts):
+        counts = Counter(tokenize(text))
+        overlap[i] = [counts[t] for t in vocabulary]
+        norms[i] = math.sqrt(sum(c * c for c in counts.values()))
+
+    dot = overlap @ query_vector
+    denominator = np.maximum(norms * np.linalg.norm(query_vector), 1e-12)
+    return dot / denominator
 
 
 class ScoutAgent:
-    def __init__(self):
-        pass
+    def __init__(
+        self,
+        clickhouse: Optional[ClickHouseClient] = None,
+        stats_ttl: float = STATS_TTL,
+    ):
+        self.clickhouse = clickhouse
+        self.stats_ttl = stats_ttl
+        self._stats: Dict[int, Tuple[float, List[Dict[str, Any]]]] = {}
+        self._stats_lock = threading.Lock()
 
-    def select_subreddits(self, project_description: str) -> List[Subreddit]:
+    def _activity_stats(self, days: int) -> List[Dict[str, Any]]:
         """
-        Simulates selecting relevant subreddits based on the project description.
-        In a real scenario, this would search Reddit and use LLM to filter.
+        Per-subreddit activity, cached for stats_ttl seconds (shared by all
+        validations in a long-running process).
         """
-        # Simulate processing time
-        # time.sleep(1)
-        return MOCK_SUBREDDITS
+        with self._stats_lock:
+            cached = self._stats.get(days)
+        if cached and time.monotonic() - cached[0] < self.stats_ttl:
+            return cached[1]
+        stats = self.clickhouse.query(subreddit_activity_query(days))
+        with self._stats_lock:
+            self._stats[days] = (time.monotonic(), stats)
+        return stats
+
+    def select_subreddits(
+        self, project_description: str, limit: int = SUBREDDIT_LIMIT, days: int = 30
+    ) -> List[Subreddit]:
+        return self.target_subreddits(
+            self.rank_subreddits(project_description, days), limit
+        )
 
-    def select_credible_users(self) -> List[User]:
+    def target_subreddits(
+        self, ranked: List[Subreddit], limit: int = SUBREDDIT_LIMIT
+    ) -> List[Subreddit]:
         """
-        Simulates selecting credible users.
+        The Green zone communities, then Orange zone ones, up to limit. When no
+        candidate reaches a zone, the best-ranked candidates are used instead.
+        The demo subreddits are used as they are.
         """
-        # time.sleep(1)
-        return MOCK_USERS
+        if self.clickhouse is None:
+            return ranked
+        zoned = [s for s in ranked if s.zone]
+        return (zoned or ranked)[:limit]
 
-    def mine_opinions(self) -> List[Comment]:
+    def rank_subreddits(
+        self, project_description: str, days: int = 30
+    ) -> List[Subreddit]:
+        """
+        Ranks candidate communities by Subreddit Relevance Index in one vectorized
+        pass, using activity stats materialized in ClickHouse, and assigns their
+        relevance zone. Candidates are the active subreddits whose recent titles
+        mention the project's keywords; those whose topic similarity stays under
+        MIN_SIMILARITY are dropped, so large unrelated communities cannot rank
+        on activity alone. Returns every remaining candidate, best first.
+        Without a ClickHouse connection, returns the demo subreddits.
         """
-        Simulates mining opinions (comments).
+        if self.clickhouse is None:
+            return [
+                s.model_copy(update={'zone': relevance_zone(s.relevance)})
+                for s in MOCK_SUBREDDITS
+            ]
+
+        stats = {row['subreddit']: row for row in self._activity_stats(days)}
+        if not stats:
+            return []
+
+        keywords = opinion_keywords(project_description)
+        if keywords:
+            names = [
+                row['subreddit']
+                for row in self.clickhouse.query(
+                    subreddit_candidates_query(keywords, days, CANDIDATE_SUBREDDITS)
+                )
+                if row['subreddit'] in stats
+            ]
+        else:
+            names = sorted(stats, key=lambda n: -float(stats[n]['dau']))
+            names = names[:CANDIDATE_SUBREDDITS]
+        if not names:
+            return []
+
+        topics = {
+            row['subreddit']: row['topic_text']
+            for row in self.clickhouse.query(subreddit_topics_query(names, days))
+        }
+        # Subreddit name tokens are part of its topic ("EatCheapAndHealthy")
+        topic_texts = [
+            re.sub(r'(?<=[a-z])(?=[A-Z])', ' ', name) + '\n' + topics.get(name, '')
+            for name in names
+        ]
+        similarity = topic_similarity(project_description, topic_texts)
+
+        related = np.nonzero(similarity >= MIN_SIMILARITY)[0]
+        names = [names[i] for i in related]
+        similarity = similarity[related]
+        rows = [stats[name] for name in names]
+        dau = np.array([float(row['dau']) for row in rows])
+        engagement = np.array([float(row['engagement_rate']) for row in rows])
+
+        relevance = calculate_subreddit_relevance(similarity, dau, engagement)
+        order = np.argsort(-relevance, kind='stable')
+
+        return [
+            Subreddit(
+                name=names[i],
+                relevance=float(relevance[i]),
+                description=(
+                    f'{dau[i]:,.0f} daily active users,'
+                    f' {engagement[i]:.1f} comments per post'
+                ),
+                similarity=float(similarity[i]),
+                activeUsers=float(dau[i]),
+                engagementRate=float(engagement[i]),
+                subscribers=int(rows[i]['subscribers']),
+                zone=relevance_zone(float(relevance[i])),
+            )
+            for i in order
+        ]
+
+    def select_credible_users(
+        self,
+        subreddits: Optional[List[Subreddit]] = None,
+        limit: int = USER_LIMIT,
+        days: int = OPINION_DAYS,
+    ) -> List[User]:
         """
-        # time.sleep(1)
-        return MOCK_COMMENTS
+        Selects the most credible authors of the selected subreddits.
+        """
+        return self.vet_authors(subreddits, limit, days).users
+
+    def vet_authors(
+        self,
+        subreddits: Optional[List[Subreddit]] = None,
+        limit: int = USER_LIMIT,
+        days: int = OPINION_DAYS,
+    ) -> AuthorVetting:
+        """
+        Selects the most credible authors of the selected subreddits. Bots and
+        low-quality accounts are dropped first, by a vectorized filter over the
+        activity features of every active author, so only the survivors are
+        scored and later reach LLM profiling. The rejected authors are returned
+        too, so their comments can be left out of the analysis.
+        Without a ClickHouse connection, returns the demo users.
+        """
+        if self.clickhouse is None:
+            return AuthorVetting(
+                users=MOCK_USERS,
+                stats=AuthorFilterStats(authors=len(MOCK_USERS), kept=len(MOCK_USERS)),
+            )
+        if not subreddits:
+            return AuthorVetting(users=[])
+
+        block = self.clickhouse.query_columns(
+            author_activity_query([s.name for s in subreddits], days, MIN_COMMENTS)
+        )
+        features = AuthorFeatures(block)
+        qualified, stats = qualify_authors(features)
+        rows = np.nonzero(qualified)[0]
+
+        domain_karma = features.domain_karma[rows]
+        total_karma = features.total_karma[rows]
+        account_age_years = features.account_age_days[rows] / 365.25
+        credibility = calculate_user_credibility(
+            domain_karma, total_karma, account_age_years, 0.0
+        )
+        order = np.argsort(-credibility, kind='stable')[:limit]
+        users = [
+            User(
+                id=features.authors[rows[i]],
+                credibility=int(round(credibility[i] * 100)),
+                tags=[],
+                domainKarma=int(domain_karma[i]),
+                totalKarma=int(total_karma[i]),
+                accountAgeYears=float(account_age_years[i]),
+            )
+            for i in order
+        ]
+        rejected = frozenset(features.authors[i] for i in np.nonzero(~qualified)[0])
+        return AuthorVetting(users=users, rejected=rejected, stats=stats)
+
+    def mine_opinions(
+        self,
+        project_description: str = '',
+        subreddits: Optional[List[Subreddit]] = None,
+        limit: int = OPINION_LIMIT,
+        days: int = OPINION_DAYS,
+    ) -> List[Comment]:
+        """
+        Mines a random subset of the comments mentioning the project's keywords
+        in the selected subreddits, each weighted by its inverse inclusion
+        probability. A sampled pass first estimates how many comments match;
+        when there are far more than needed, only a random share of threads is
+        read. Without a ClickHouse connection, returns the demo comments.
+        """
+        if self.clickhouse is None:
+            return MOCK_COMMENTS
+        if not subreddits:
+            return []
+
+        names = [s.name for s in subreddits]
+        keywords = opinion_keywords(project_description)
+
+        estimated = sum(
+            float(row['estimated_comments'])
+            for row in self.clickhouse.query(
+                keyword_volume_query(names, keywords, days, EXPLORE_SAMPLE)
+            )
+        )
+        sample = None
+        if estimated > limit * OVERSAMPLE:
+            sample = max(round(limit * OVERSAMPLE / estimated, 3), 0.001)
+
+        rows = self.clickhouse.query(
+            opinion_comments_query(names, keywords, days, limit, sample)
+        )
+        return [
+            Comment(
+                id=row['id'],
+                author=row['author'],
+                text=row['body'],
+                score=int(row['score']),
+                isExpert=row['distinguished'] is not None,
+                linkId=row['link_id'],
+                parentId=row['parent_id'],
+                subreddit=row['subreddit'],
+                weight=float(row['weight']),
+            )
+            for row in rows
+        ]
+
+    def rank_opinions(
+        self,
+        project_description: str,
+        comments: List[Comment],
+    ) -> List[Comment]:
+        """
+        Ranks mined comments by BM25 against the description and drops those
+        sharing no term with it, so off-topic comments never reach the LLM
+        stages. There is no top-N cut: the stratified sampler bounds the corpus
+        without skewing its weights. Bare agreement replies are dropped here
+        too; they are fetched for the comments that survive ranking and
+        sampling instead (see agreement_replies).
+        The demo comments are returned as is.
+        """
+        if self.clickhouse is None:
+            return comments
+        return rank_comments(comments, project_description)
+
+    def agreement_replies(self, comments: List[Comment]) -> List[Comment]:
+        """
+        Fetches the short direct replies to the given comments, raw, for the
+        analyst to fold into the comment they agree with (callers keep only
+        those passing is_agreement once normalized). Each reply carries its
+        parent's sampling weight. Without a ClickHouse connection, returns none.
+        """
+        if self.clickhouse is None or not comments:
+            return []
+
+        weights = {f't1_{c.id}': c.weight for c in comments}
+        rows = self.clickhouse.query(
+            agreement_replies_query(
+                sorted({c.subreddit for c in comments if c.subreddit}),
+                sorted({c.linkId for c in comments if c.linkId}),
+                list(weights),
+            )
+        )
+        return [
+            Comment(
+                id=row['id'],
+                author=row['author'],
+                text=row['body'],
+                score=int(row['score']),
+                isExpert=row['distinguished'] is not None,
+                linkId=row['link_id'],
+                parentId=row['parent_id'],
+                subreddit=row['subreddit'],
+                weight=weights[row['parent_id']],
+            )
+            for row in rows
+            # Replies already in the corpus (they matched the keywords) stay as they are
+            if 't1_' + row['id'] not in weights
+        ]
@@ -0,0 +1,109 @@
+import json
+from typing import Any, Dict, Iterator, List, Optional, Type, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+T = TypeVar('T', bound=BaseModel)
+
+
+class JsonArrayItemParser:
+    """
+    Incremental parser for streamed structured outputs shaped like
+    {"<key>": [{...}, {...}, ...]}.
+    Feed it text deltas as they arrive; it returns every array item whose
+    closing brace has been seen, without waiting for the rest of the document.
+    Only the text of an unfinished item or string is kept between feeds, so
+    each character is scanned once however long the stream gets.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.buffer = ''  # Unconsumed text; scanned up to pos
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.string_start = 0
+        self.last_string: Optional[str] = None
+        self.array_depth: Optional[int] = None
+        self.item_start: Optional[int] = None
+        self.done = False
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        buffer = self.buffer + chunk
+        items = []
+
+        for i in range(self.pos, len(buffer)):
+            if self.done:
+                break
+            c = buffer[i]
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif c == '\\':
+                    self.escape = True
+                elif c == '"':
+                    self.in_string = False
+                    if self.depth == 1:
+                        self.last_string = buffer[self.string_start + 1 : i]
+                continue
+
+            if c == '"':
+                self.in_string = True
+                self.string_start = i
+            elif c == '{' or c == '[':
+                self.depth += 1
+                if self.array_depth is None:
+                    if c == '[' and self.depth == 2 and self.last_string == self.key:
+                        self.array_depth = self.depth
+                elif c == '{' and self.depth == self.array_depth + 1:
+                    self.item_start = i
+            elif c == '}' or c == ']':
+                if (
+                    self.array_depth is not None
+                    and c == '}'
+                    and self.depth == self.array_depth + 1
+                    and self.item_start is not None
+                ):
+                    items.append(json.loads(buffer[self.item_start : i + 1]))
+                    self.item_start = None
+                self.depth -= 1
+                if self.array_depth is not None and self.depth < self.array_depth:
+                    self.done = True
+
+        # Drop the consumed prefix, keeping an open item or string from its start
+        keep = len(buffer)
+        if self.item_start is not None:
+            keep = self.item_start
+        if self.in_string:
+            keep = min(keep, self.string_start)
+        self.buffer = buffer[keep:]
+        self.pos = len(buffer) - keep
+        if self.item_start is not None:
+            self.item_start -= keep
+        self.string_start -= keep
+        return items
+
+
+def stream_items(deltas: Iterator[str], key: str, item_model: Type[T]) -> Iterator[T]:
+    """
+    Yields validated items of the `key` array as soon as each one is complete.
+    Items that fail validation are skipped.
+    """
+    parser = JsonArrayItemParser(key)
+    for delta in deltas:
+        for item in parser.feed(delta):
+            try:
+                yield item_model.model_validate(item)
+            except ValidationError as e:
+                print(f'Skipping invalid streamed {item_model.__name__}: {e}')
+
+
+def content_deltas(stream) -> Iterator[str]:
+    """
+    Text deltas of an OpenAI chat completion stream.
+    """
+    for event in stream:
+        if event.type == 'content.delta':
+            yield event.delta
@@ -0,0 +1,134 @@
+import threading
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+
+from pydantic import BaseModel
+
+
+class StageUsage(BaseModel):
+    calls: int = 0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    completion_tokens: int = 0
+    calls_by_model: Dict[str, int] = {}
+    cascade_calls: int = 0
+    escalations: int = 0
+    hedges: int = 0
+    timeouts: int = 0
+
+    @property
+    def escalation_rate(self) -> float:
+        """
+        Share of cascaded calls whose first pass was redone on the larger model.
+        """
+        return self.escalations / self.cascade_calls if self.cascade_calls else 0.0
+
+    @property
+    def cache_hit_rate(self) -> float:
+        """
+        Share of prompt tokens served from the provider's prompt cache.
+        """
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+
+class Telemetry:
+    """
+    Per-stage LLM usage counters, safe to update from worker threads.
+    Updates are mirrored into the telemetry of the current run, if one is set
+    (see run_telemetry), so a shared client can still report per request.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, StageUsage] = {}
+        self._lock = threading.Lock()
+
+    def _update(self, stage: str, apply: Callable[[StageUsage], None]) -> None:
+        with self._lock:
+            apply(self.stages.setdefault(stage, StageUsage()))
+        scoped = run_telemetry.get()
+        if scoped is not None and scoped is not self:
+            with scoped._lock:
+                apply(scoped.stages.setdefault(stage, StageUsage()))
+
+    def record_usage(self, stage: str, usage, model: Optional[str] = None) -> None:
+        """
+        Records an OpenAI `usage` object (may be None when not reported).
+        """
+
+        def apply(stats: StageUsage) -> None:
+            stats.calls += 1
+            if model:
+                stats.calls_by_model[model] = stats.calls_by_model.get(model, 0) + 1
+            if usage is None:
+                return
+            stats.prompt_tokens += usage.prompt_tokens or 0
+            stats.completion_tokens += usage.completion_tokens or 0
+            details = getattr(usage, 'prompt_tokens_details', None)
+            stats.cached_tokens += (details.cached_tokens or 0) if details else 0
+
+        self._update(stage, apply)
+
+    def record_cascade(self, stage: str, escalated: bool) -> None:
+        def apply(stats: StageUsage) -> None:
+            stats.cascade_calls += 1
+            stats.escalations += int(escalated)
+
+        self._update(stage, apply)
+
+    def record_hedge(self, stage: str) -> None:
+        def apply(stats: StageUsage) -> None:
+            stats.hedges += 1
+
+        self._update(stage, apply)
+
+    def record_timeout(self, stage: str) -> None:
+        def apply(stats: StageUsage) -> None:
+            stats.timeouts += 1
+
+        self._update(stage, apply)
+
+    def merge(self, stages: Dict[str, StageUsage]) -> None:
+        """
+        Adds usage recorded elsewhere (e.g. by worker processes).
+        """
+        for stage, usage in stages.items():
+
+            def apply(stats: StageUsage, usage: StageUsage = usage) -> None:
+                for field in (
+                    'calls',
+                    'prompt_tokens',
+                    'cached_tokens',
+                    'completion_tokens',
+                    'cascade_calls',
+                    'escalations',
+                    'hedges',
+                    'timeouts',
+                ):
+                    setattr(stats, field, getattr(stats, field) + getattr(usage, field))
+                for model, calls in usage.calls_by_model.items():
+                    stats.calls_by_model[model] = (
+                        stats.calls_by_model.get(model, 0) + calls
+                    )
+
+            self._update(stage, apply)
+
+    def summary(self) -> str:
+        lines = []
+        for stage, stats in sorted(self.stages.items()):
+            line = (
+                f'{stage}: {stats.calls} calls, {stats.prompt_tokens} prompt tokens'
+                f' ({stats.cache_hit_rate:.0%} cached), {stats.completion_tokens} completion tokens'
+            )
+            if stats.cascade_calls:
+                line += f', {stats.escalation_rate:.0%} escalated'
+            if stats.hedges or stats.timeouts:
+                line += f', {stats.hedges} hedged, {stats.timeouts} timed out'
+            lines.append(line)
+        return '\n'.join(lines)
+
+
+# Telemetry of the validation run in progress. Worker threads started with
+# asyncio.to_thread inherit it, so usage is attributed to the right request.
+run_telemetry: ContextVar[Optional[Telemetry]] = ContextVar(
+    'run_telemetry', default=None
+)
@@ -0,0 +1,96 @@
+"""
+Granules read by the scout's opinion-mining queries with and without the
+body skip indexes and thread sampling, from EXPLAIN indexes = 1.
+
+Usage:
+    python -m db.bench_indexes --subreddits EatCheapAndHealthy,MealPrepSunday \\
+        --description "An app that tracks what is in your fridge"
+    python -m db.bench_indexes --local-path ./chdata --subreddits travel --keywords itinerary,hidden
+"""
+
+import argparse
+import re
+from typing import List, Optional, Tuple
+
+from agents.scout_agent import EXPLORE_SAMPLE, opinion_keywords
+from db.clickhouse import ClickHouseClient
+from db.queries import keyword_volume_query, opinion_comments_query
+
+GRANULES_RE = re.compile(r'Granules: (\d+)(?:/(\d+))?')
+
+
+def granules_read(
+    client: ClickHouseClient, sql: str, use_skip_indexes: bool = True
+) -> Tuple[int, int]:
+    """
+    (granules selected, granules in the parts considered) for a query.
+    """
+    plan = client.execute(
+        f'EXPLAIN indexes = 1 {sql.strip().rstrip(";")}'
+        f' SETTINGS use_skip_indexes = {int(use_skip_indexes)} FORMAT TSVRaw'
+    ).decode()
+    selected, total = None, 0
+    for match in GRANULES_RE.finditer(plan):
+        if match.group(2) is None:
+            # "Parts: n | Granules: m" on ReadFromMergeTree: what is actually read
+            selected = (selected or 0) + int(match.group(1))
+        elif not total:
+            total = int(match.group(2))
+    return selected or 0, total
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='Skip index / sampling benchmark')
+    parser.add_argument('--clickhouse-url')
+    parser.add_argument('--database', default='default')
+    parser.add_argument('--local-path')
+    parser.add_argument('--subreddits', required=True)
+    parser.add_argument('--keywords')
+    parser.add_argument('--description', default='')
+    parser.add_argument('--days', type=int, default=365)
+    args = parser.parse_args(argv)
+
+    client = ClickHouseClient(
+        url=args.clickhouse_url, database=args.database, local_path=args.local_path
+    )
+    subreddits = args.subreddits.split(',')
+    keywords = (
+        args.keywords.lower().split(',')
+        if args.keywords
+        else opinion_keywords(args.description)
+    )
+    print(f'Keywords: {", ".join(keywords)}')
+
+    cases = [
+        (
+            'subreddits only (primary key)',
+            opinion_comments_query(subreddits, None, args.days),
+            True,
+        ),
+        (
+            'keyword filter, skip indexes off',
+            opinion_comments_query(subreddits, keywords, args.days),
+            False,
+        ),
+        (
+            'keyword filter, skip indexes on',
+            opinion_comments_query(subreddits, keywords, args.days),
+            True,
+        ),
+        (
+            f'keyword volume, SAMPLE {EXPLORE_SAMPLE}',
+            keyword_volume_query(subreddits, keywords, args.days, EXPLORE_SAMPLE),
+            True,
+        ),
+    ]
+
+    baseline = None
+    for label, sql, use_skip_indexes in cases:
+        selected, total = granules_read(client, sql, use_skip_indexes)
+        baseline = baseline or selected
+        share = selected / baseline if baseline else 0.0
+        print(f'{label:<36} {selected:>10,} / {total:,} granules ({share:.1%})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+import http.client
+import json
+import os
+import select
+import subprocess
+import threading
+import urllib.parse
+from typing import Any, Dict, List, Optional, Sequence
+
+from db.queries import quote
+
+
+class ClickHouseError(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Idle keep-alive HTTP connections to one server, reused across queries.
+    """
+
+    def __init__(self, url: str, timeout: float, size: int = 8):
+        parts = urllib.parse.urlsplit(url)
+        self.https = parts.scheme == 'https'
+        self.host = parts.hostname or 'localhost'
+        self.port = parts.port
+        self.path = parts.path.rstrip('/')
+        self.timeout = timeout
+        self.size = size
+        self._idle: List[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+
+    def acquire(self) -> Optional[http.client.HTTPConnection]:
+        """
+        An idle connection, skipping those the server has closed meanwhile
+        (their socket reads as ready: EOF or a stray reply).
+        """
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                connection = self._idle.pop()
+            sock = connection.sock
+            if sock is not None and sock.fileno() >= 0:
+                if not select.select([sock], [], [], 0)[0]:
+                    return connection
+            connection.close()
+
+    def connect(self) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def release(self, connection: http.client.HTTPConnection) -> None:
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+
+class ClickHouseClient:
+    """
+    Minimal ClickHouse client.
+    Talks to a server over the HTTP interface, or runs `clickhouse local`
+    against an on-disk path when `local_path` is given (handy for testing
+    against local files without a server).
+    """
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        database: str = 'default',
+        user: Optional[str] = None,
+        password: Optional[str] = None,
+        local_path: Optional[str] = None,
+        local_binary: str = 'clickhouse',
+        timeout: float = 300.0,
+    ):
+        self.url = url or os.getenv('CLICKHOUSE_URL', 'http://localhost:8123')
+        self.database = database
+        self.user = user or os.getenv('CLICKHOUSE_USER')
+        self.password = password or os.getenv('CLICKHOUSE_PASSWORD')
+        self.local_path = local_path
+        self.local_binary = local_binary
+        self.timeout = timeout
+        self.pool = ConnectionPool(self.url, timeout)
+
+    def _run_local(self, sql: str, data: Optional[bytes]) -> bytes:
+        cmd = [
+            self.local_binary,
+            'local',
+            '--path',
+            self.local_path,
+            '--database',
+            self.database,
+            '--query',
+            sql,
+        ]
+        proc = subprocess.run(cmd, input=data, capture_output=True)
+        if proc.returncode != 0:
+            raise ClickHouseError(proc.stderr.decode(errors='replace').strip())
+        return proc.stdout
+
+    def _run_http(self, sql: str, data: Optional[bytes]) -> bytes:
+        params = {'database': self.database}
+        if data is not None:
+            # With a body, the statement has to travel in the query string
+            params['query'] = sql
+            body = data
+        else:
+            body = sql.encode()
+
+        headers = {}
+        if self.user:
+            headers['X-ClickHouse-User'] = self.user
+        if self.password:
+            headers['X-ClickHouse-Key'] = self.password
+        target = f'{self.pool.path}/?{urllib.parse.urlencode(params)}'
+
+        # A pooled connection can still be closed by the server right after it
+        # was checked. Only a failure to send on a reused connection is retried
+        # (once, on a fresh connection). Once the request is out, the server
+        # may have run it, so errors and timeouts waiting for the response are
+        # raised rather than re-executing the statement.
+        connection = self.pool.acquire()
+        while True:
+            reused = connection is not None
+            connection = connection or self.pool.connect()
+            try:
+                connection.request('POST', target, body=body, headers=headers)
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                if not reused:
+                    raise
+                connection = None
+                continue
+            try:
+                response = connection.getresponse()
+                payload = response.read()
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                raise
+            break
+
+        self.pool.release(connection)
+        if response.status != 200:
+            raise ClickHouseError(payload.decode(errors='replace').strip())
+        return payload
+
+    def execute(self, sql: str, data: Optional[bytes] = None) -> bytes:
+        if self.local_path:
+            return self._run_local(sql, data)
+        return self._run_http(sql, data)
+
+    def command(self, sql: str) -> None:
+        self.execute(sql)
+
+    def query(self, sql: str) -> List[Dict[str, Any]]:
+        """
+        Runs a SELECT and returns rows as dicts.
+        """
+        raw = self.execute(f'{sql.rstrip().rstrip(";")} FORMAT JSONEachRow')
+        return [json.loads(line) for line in raw.splitlines() if line]
+
+    def query_columns(self, sql: str) -> Dict[str, List[Any]]:
+        """
+        Runs a SELECT and returns the result as a columnar block.
+        """
+        raw = self.execute(f'{sql.rstrip().rstrip(";")} FORMAT JSONColumns')
+        return json.loads(raw) if raw.strip() else {}
+
+    def insert_columns(
+        self,
+        table: str,
+        column_names: Sequence[str],
+        columns: Sequence[Sequence[Any]],
+        dedup_token: Optional[str] = None,
+    ) -> None:
+        """
+        Inserts a columnar batch (one list of values per column).
+        With dedup_token, inserting the same batch again under the same token is
+        a no-op (on tables with non_replicated_deduplication_window set), so a
+        replayed or partially sent insert never duplicates rows.
+        """
+        payload = json.dumps(list(columns), ensure_ascii=False, separators=(',', ':'))
+        settings = (
+            f' SETTINGS insert_deduplication_token = {quote(dedup_token)}'
+            if dedup_token
+            else ''
+        )
+        self.execute(
+            f'INSERT INTO {table} ({", ".join(column_names)}){settings}'
+            ' FORMAT JSONCompactColumns',
+            payload.encode(),
+        )
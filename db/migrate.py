@@ -0,0 +1,332 @@
+"""
+Applies the schema migrations in sql/migrations/ in order, recording each
+applied version in a `schema_migrations` table.
+
+Every completed statement is also recorded in `schema_migration_steps`, so a
+migration that fails halfway resumes where it stopped when rerun. Besides
+ClickHouse statements, a migration can contain
+
+    COPY PARTITIONS FROM <source> TO <target>
+
+which copies a table one partition at a time: each partition's INSERT stays
+well within the client timeout, a partially copied partition is dropped and
+copied again on rerun, and every partition's row count is checked. The copy
+fails unless the tables hold the same number of rows at the end, so a swap
+that follows it only runs on a complete copy. Likewise
+
+    BACKFILL PARTITIONS FROM <source> TO <target> AS SELECT ...
+
+fills a rollup table from its source one partition at a time: each partition
+of the target is dropped and refilled by the SELECT, in which `{partition}`
+stands for the quoted source partition ID. Both tables must be partitioned
+alike.
+
+`EXCHANGE TABLES` and `RENAME TABLE` are checked against the live tables
+before they run, as a crash can land between the statement and its step
+record: the new table's sorting key is recorded before a swap, and a rerun
+that finds it on the live table does not swap the tables back; a rename whose
+source is gone and whose target exists is taken as done.
+
+Tables created from the current sql/create_*.sql files already have the
+latest schema; record that with --baseline instead of running the migrations.
+
+Usage:
+    python -m db.migrate
+    python -m db.migrate --baseline
+    python -m db.migrate --local-path ./chdata
+"""
+
+import argparse
+import re
+from pathlib import Path
+from typing import List, Optional, Set, Tuple
+
+from db.clickhouse import ClickHouseClient, ClickHouseError
+from db.queries import quote
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / 'sql' / 'migrations'
+COPY_PARTITIONS_RE = re.compile(r'^COPY PARTITIONS FROM (\w+) TO (\w+)$', re.IGNORECASE)
+EXCHANGE_TABLES_RE = re.compile(r'^EXCHANGE TABLES (\w+) AND (\w+)$', re.IGNORECASE)
+BACKFILL_PARTITIONS_RE = re.compile(
+    r'^BACKFILL PARTITIONS FROM (\w+) TO (\w+) AS\s+(SELECT\b.*)$',
+    re.IGNORECASE | re.DOTALL,
+)
+RENAME_TABLE_RE = re.compile(r'^RENAME TABLE (\w+) TO (\w+)$', re.IGNORECASE)
+
+
+class MigrationError(Exception):
+    pass
+
+
+def list_migrations() -> List[Tuple[str, Path]]:
+    return sorted((path.stem, path) for path in MIGRATIONS_DIR.glob('*.sql'))
+
+
+def split_statements(text: str) -> List[str]:
+    """
+    Splits a migration file on statement-ending semicolons, dropping comments.
+    """
+    text = re.sub(r'^\s*--.*$', '', text, flags=re.MULTILINE)
+    return [s.strip() for s in re.split(r';\s*(?:\n|$)', text) if s.strip()]
+
+
+def applied_versions(client: ClickHouseClient) -> List[str]:
+    client.command(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version String,
+            applied_at DateTime DEFAULT now()
+        ) ENGINE = MergeTree()
+        ORDER BY version
+        """
+    )
+    return [
+        row['version'] for row in client.query('SELECT version FROM schema_migrations')
+    ]
+
+
+def completed_steps(client: ClickHouseClient, version: str) -> Set[str]:
+    client.command(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migration_steps (
+            version String,
+            step String,
+            rows UInt64 DEFAULT 0,
+            done_at DateTime DEFAULT now()
+        ) ENGINE = MergeTree()
+        ORDER BY (version, step)
+        """
+    )
+    return {
+        row['step']
+        for row in client.query(
+            f'SELECT step FROM schema_migration_steps WHERE version = {quote(version)}'
+        )
+    }
+
+
+def record_step(
+    client: ClickHouseClient, version: str, step: str, rows: int = 0
+) -> None:
+    client.command(
+        'INSERT INTO schema_migration_steps (version, step, rows)'
+        f' VALUES ({quote(version)}, {quote(step)}, {int(rows)})'
+    )
+
+
+def count_rows(
+    client: ClickHouseClient, table: str, partition: Optional[str] = None
+) -> int:
+    where = f' WHERE _partition_id = {quote(partition)}' if partition else ''
+    return int(client.query(f'SELECT count() AS rows FROM {table}{where}')[0]['rows'])
+
+
+def partition_ids(client: ClickHouseClient, table: str) -> List[str]:
+    return [
+        row['partition_id']
+        for row in client.query(
+            'SELECT DISTINCT partition_id FROM system.parts'
+            f' WHERE database = currentDatabase() AND table = {quote(table)} AND active'
+            ' ORDER BY partition_id'
+        )
+    ]
+
+
+def sorting_key(client: ClickHouseClient, table: str) -> Optional[str]:
+    """
+    The table's sorting key as system.tables shows it, or None if there is no
+    such table.
+    """
+    rows = client.query(
+        'SELECT sorting_key FROM system.tables'
+        f' WHERE database = currentDatabase() AND name = {quote(table)}'
+    )
+    return rows[0]['sorting_key'] if rows else None
+
+
+def exchange_tables(
+    client: ClickHouseClient,
+    version: str,
+    step: str,
+    live: str,
+    new: str,
+    done: Set[str],
+) -> None:
+    """
+    Swaps live and new unless an earlier run already did: the new table's
+    sorting key is recorded before the swap and compared with the live
+    table's on rerun.
+    """
+    prefix = f'{step}:sorting_key='
+    target = next((s[len(prefix) :] for s in done if s.startswith(prefix)), None)
+    if target is None:
+        target, current = sorting_key(client, new), sorting_key(client, live)
+        if target is None or current is None:
+            raise MigrationError(f'{version}: {live} and {new} must both exist')
+        if target == current:
+            raise MigrationError(
+                f'{version}: {live} and {new} are both sorted by ({target});'
+                ' a rerun could not tell whether they were swapped'
+            )
+        record_step(client, version, prefix + target)
+    if sorting_key(client, live) == target:
+        print(f'{live} already has the new sorting key; not swapping')
+        return
+    client.command(f'EXCHANGE TABLES {live} AND {new}')
+
+
+def rename_table(client: ClickHouseClient, source: str, target: str) -> None:
+    if sorting_key(client, source) is None and sorting_key(client, target) is not None:
+        print(f'{source} was already renamed to {target}')
+        return
+    client.command(f'RENAME TABLE {source} TO {target}')
+
+
+def copy_partitions(
+    client: ClickHouseClient,
+    version: str,
+    step: str,
+    source: str,
+    target: str,
+    done: Set[str],
+) -> None:
+    """
+    Copies source into target partition by partition, skipping partitions
+    recorded as copied, then checks that both tables hold the same rows.
+    """
+    columns = ', '.join(
+        row['name']
+        for row in client.query(
+            'SELECT name FROM system.columns'
+            f' WHERE database = currentDatabase() AND table = {quote(target)}'
+            ' ORDER BY position'
+        )
+    )
+    for partition in partition_ids(client, source):
+        partition_step = f'{step}:{partition}'
+        if partition_step in done:
+            continue
+        # Whatever a failed attempt left of this partition is copied again
+        client.command(f'ALTER TABLE {target} DROP PARTITION ID {quote(partition)}')
+        client.command(
+            f'INSERT INTO {target} ({columns}) SELECT {columns} FROM {source}'
+            f' WHERE _partition_id = {quote(partition)}'
+        )
+        expected = count_rows(client, source, partition)
+        copied = count_rows(client, target, partition)
+        if copied != expected:
+            raise MigrationError(
+                f'{version}: partition {partition} of {source} has {expected} rows,'
+                f' {target} got {copied}'
+            )
+        record_step(client, version, partition_step, copied)
+        print(f'Copied partition {partition} of {source} ({copied} rows)')
+
+    expected, copied = count_rows(client, source), count_rows(client, target)
+    if copied != expected:
+        raise MigrationError(
+            f'{version}: {source} has {expected} rows, {target} has {copied};'
+            ' was ingestion paused?'
+        )
+
+
+def backfill_partitions(
+    client: ClickHouseClient,
+    version: str,
+    step: str,
+    source: str,
+    target: str,
+    select: str,
+    done: Set[str],
+) -> None:
+    """
+    Refills target from select one source partition at a time, skipping
+    partitions recorded as done.
+    """
+    if '{partition}' not in select:
+        raise MigrationError(
+            f'{version}: BACKFILL PARTITIONS needs a {{partition}} filter'
+        )
+    for partition in partition_ids(client, source):
+        partition_step = f'{step}:{partition}'
+        if partition_step in done:
+            continue
+        # Rows the target got for this partition are recomputed from the source
+        client.command(f'ALTER TABLE {target} DROP PARTITION ID {quote(partition)}')
+        client.command(
+            f'INSERT INTO {target} ' + select.replace('{partition}', quote(partition))
+        )
+        rows = count_rows(client, target, partition)
+        record_step(client, version, partition_step, rows)
+        print(f'Backfilled partition {partition} of {target} ({rows} rows)')
+
+
+def apply_migration(client: ClickHouseClient, version: str, path: Path) -> None:
+    done = completed_steps(client, version)
+    for i, statement in enumerate(split_statements(path.read_text())):
+        step = str(i)
+        if step in done:
+            continue
+        copy = COPY_PARTITIONS_RE.match(statement)
+        backfill = BACKFILL_PARTITIONS_RE.match(statement)
+        exchange = EXCHANGE_TABLES_RE.match(statement)
+        rename = RENAME_TABLE_RE.match(statement)
+        if copy:
+            copy_partitions(client, version, step, *copy.groups(), done)
+        elif backfill:
+            backfill_partitions(client, version, step, *backfill.groups(), done)
+        elif exchange:
+            exchange_tables(client, version, step, *exchange.groups(), done)
+        elif rename:
+            rename_table(client, *rename.groups())
+        else:
+            client.command(statement)
+        record_step(client, version, step)
+
+
+def migrate(client: ClickHouseClient, baseline: bool = False) -> List[str]:
+    """
+    Runs pending migrations (or only records them, with baseline).
+    Returns the versions handled.
+    """
+    done = set(applied_versions(client))
+    handled = []
+    for version, path in list_migrations():
+        if version in done:
+            continue
+        if not baseline:
+            print(f'Applying {version}')
+            apply_migration(client, version, path)
+        client.command(
+            f'INSERT INTO schema_migrations (version) VALUES ({quote(version)})'
+        )
+        handled.append(version)
+    return handled
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='ClickHouse schema migrations')
+    parser.add_argument('--clickhouse-url')
+    parser.add_argument('--database', default='default')
+    parser.add_argument('--local-path')
+    parser.add_argument(
+        '--baseline',
+        action='store_true',
+        help='Mark all migrations as applied without running them',
+    )
+    args = parser.parse_args(argv)
+
+    client = ClickHouseClient(
+        url=args.clickhouse_url, database=args.database, local_path=args.local_path
+    )
+    try:
+        handled = migrate(client, baseline=args.baseline)
+    except (MigrationError, ClickHouseError) as e:
+        print(f'Error migrating: {e}')
+        print('Fix the cause and rerun; completed steps are not repeated.')
+        raise SystemExit(1)
+    print(f'{"Recorded" if args.baseline else "Applied"} {len(handled)} migrations')
+
+
+if __name__ == '__main__':
+    main()
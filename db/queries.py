@@ -0,0 +1,238 @@
+from typing import Iterable, Optional
+
+
+def quote(value: str) -> str:
+    """
+    Quotes a string literal for ClickHouse SQL.
+    """
+    return "'" + value.replace('\\', '\\\\').replace("'", "\\'") + "'"
+
+
+def _in_list(column: str, values: Optional[Iterable[str]]) -> str:
+    if values is None:
+        return ''
+    return f'AND {column} IN ({", ".join(quote(v) for v in values)})'
+
+
+def _keyword_filter(column: str, keywords: Optional[Iterable[str]]) -> str:
+    """
+    Substring match on any keyword, which the ngrambf_v1 skip index on
+    lower(column) can serve. Keywords must be lowercase and at least as long
+    as the index n-gram (4); a shorter one disables the index for the query.
+    """
+    if not keywords:
+        return ''
+    return f'AND multiSearchAny(lower({column}), [{", ".join(quote(k) for k in keywords)}])'
+
+
+def _sample(fraction: Optional[float]) -> str:
+    return f'SAMPLE {float(fraction)}' if fraction else ''
+
+
+def subreddit_activity_query(days: int = 30, min_posts: int = 10) -> str:
+    """
+    Window-level activity per subreddit: average DAU and comments per post.
+    """
+    return f"""
+        SELECT
+            subreddit,
+            avg(day_dau) AS dau,
+            sum(day_posts) AS posts,
+            sum(day_comments) AS comments,
+            comments / greatest(posts, 1) AS engagement_rate,
+            max(day_subscribers) AS subscribers
+        FROM (
+            SELECT
+                subreddit,
+                day,
+                uniqMerge(active_users) AS day_dau,
+                sum(posts) AS day_posts,
+                sum(comments) AS day_comments,
+                max(subscribers) AS day_subscribers
+            FROM subreddit_daily_stats
+            WHERE day >= today() - {int(days)}
+            GROUP BY subreddit, day
+        )
+        GROUP BY subreddit
+        HAVING posts >= {int(min_posts)}
+    """
+
+
+def subreddit_candidates_query(
+    keywords: Iterable[str], days: int = 30, limit: int = 200, min_posts: int = 10
+) -> str:
+    """
+    Subreddits whose recent submission titles mention any keyword, most
+    matches first, among those with at least min_posts posts in the window.
+    The keyword filter is served by the ngrambf_v1 index on lower(title).
+    """
+    return f"""
+        SELECT subreddit, count() AS matches
+        FROM submissions
+        WHERE created_utc >= now() - INTERVAL {int(days)} DAY
+            {_keyword_filter('title', keywords)}
+            AND subreddit IN (
+                SELECT subreddit
+                FROM subreddit_daily_stats
+                WHERE day >= today() - {int(days)}
+                GROUP BY subreddit
+                HAVING sum(posts) >= {int(min_posts)}
+            )
+        GROUP BY subreddit
+        ORDER BY matches DESC
+        LIMIT {int(limit)}
+    """
+
+
+def subreddit_topics_query(
+    subreddits: Iterable[str], days: int = 30, titles_per_subreddit: int = 200
+) -> str:
+    """
+    A sample of recent submission titles per subreddit, used as its topic text.
+    Meant for a bounded candidate list (see subreddit_candidates_query).
+    """
+    return f"""
+        SELECT
+            subreddit,
+            arrayStringConcat(groupArraySample({int(titles_per_subreddit)})(title), '\\n') AS topic_text
+        FROM submissions
+        WHERE created_utc >= now() - INTERVAL {int(days)} DAY {_in_list('subreddit', subreddits)}
+        GROUP BY subreddit
+    """
+
+
+def agreement_replies_query(
+    subreddits: Iterable[str],
+    link_ids: Iterable[str],
+    parent_ids: Iterable[str],
+    max_length: int = 200,
+    per_parent: int = 100,
+) -> str:
+    """
+    Short direct replies to the given comments (parent_ids are t1_ fullnames),
+    the candidates for agreement folding. The subreddit and thread filters let
+    the primary key skip every other thread.
+    """
+    return f"""
+        SELECT id, link_id, parent_id, author, body, score, distinguished, subreddit
+        FROM comments
+        WHERE length(body) <= {int(max_length)}
+            {_in_list('subreddit', subreddits)}
+            {_in_list('link_id', link_ids)}
+            {_in_list('parent_id', parent_ids)}
+        ORDER BY parent_id, created_utc, id
+        LIMIT {int(per_parent)} BY parent_id
+    """
+
+
+def keyword_volume_query(
+    subreddits: Iterable[str],
+    keywords: Iterable[str],
+    days: int = 365,
+    sample: float = 0.1,
+) -> str:
+    """
+    Estimated number of comments matching the keywords per subreddit, from a
+    sample of whole threads (cheap exploratory pass).
+    """
+    return f"""
+        SELECT subreddit, sum(_sample_factor) AS estimated_comments
+        FROM comments {_sample(sample)}
+        WHERE created_utc >= now() - INTERVAL {int(days)} DAY
+            {_in_list('subreddit', subreddits)}
+            {_keyword_filter('body', keywords)}
+        GROUP BY subreddit
+    """
+
+
+def opinion_comments_query(
+    subreddits: Iterable[str],
+    keywords: Optional[Iterable[str]] = None,
+    days: int = 365,
+    limit: int = 2000,
+    sample: Optional[float] = None,
+) -> str:
+    """
+    A uniform random subset of at most limit comments mentioning any keyword,
+    picked by a hash of the id rather than by score, so the cut does not
+    favour any kind of comment. With sample, only that share of threads is
+    read; threads are kept whole, so reply chains stay intact. weight is the
+    inverse of each comment's inclusion probability over both steps.
+    """
+    return f"""
+        SELECT
+            id, link_id, parent_id, author, body, score, distinguished, subreddit,
+            _sample_factor * greatest(count() OVER () / {int(limit)}, 1) AS weight
+        FROM comments {_sample(sample)}
+        WHERE created_utc >= now() - INTERVAL {int(days)} DAY
+            {_in_list('subreddit', subreddits)}
+            {_keyword_filter('body', keywords)}
+            AND author NOT IN ('[deleted]', 'AutoModerator')
+        ORDER BY cityHash64(id)
+        LIMIT {int(limit)}
+    """
+
+
+def author_activity_query(
+    subreddits: Iterable[str],
+    days: int = 365,
+    min_comments: int = 3,
+) -> str:
+    """
+    Per-author activity features over the window, for the authors with at
+    least min_comments comments in the subreddits. The candidates are found
+    on the comments' (subreddit, ...) primary key; their features are merged
+    from the author_daily_stats rollup, keyed by author, so no comment body
+    is read. Karma and features cover all of an author's comments in the
+    window's days, not only those subreddits. Posting regularity is measured
+    on the author's first 500 comments; first_seen_days (days since the
+    author's first comment on record) stands in for account age, which the
+    dumps do not record.
+    """
+    names = ', '.join(quote(s) for s in subreddits)
+    return f"""
+        SELECT
+            author,
+            recent_comments AS comments,
+            domain_comments,
+            domain_karma,
+            total_karma,
+            if(
+                length(intervals) > 1,
+                arrayReduce('stddevPop', intervals) / greatest(arrayAvg(intervals), 1),
+                0
+            ) AS interval_cv,
+            length_entropy,
+            1 - unique_bodies / recent_comments AS duplicate_ratio,
+            distinguished_comments / recent_comments AS distinguished_rate,
+            controversial_comments / recent_comments AS controversiality_rate,
+            dateDiff('day', first_comment, now()) AS first_seen_days
+        FROM (
+            WITH day >= today() - {int(days)} AS recent
+            SELECT
+                author,
+                sumIf(comments, recent) AS recent_comments,
+                sumIf(comments, recent AND subreddit IN ({names})) AS domain_comments,
+                sumIf(karma, recent AND subreddit IN ({names})) AS domain_karma,
+                sumIf(karma, recent) AS total_karma,
+                arrayPopFront(arrayDifference(
+                    groupArraySortedMergeIf(500)(timestamps, recent)
+                )) AS intervals,
+                entropyMergeIf(length_buckets, recent) AS length_entropy,
+                uniqMergeIf(bodies, recent) AS unique_bodies,
+                sumIf(distinguished, recent) AS distinguished_comments,
+                sumIf(controversial, recent) AS controversial_comments,
+                min(first_seen) AS first_comment
+            FROM author_daily_stats
+            WHERE author IN (
+                SELECT author
+                FROM comments
+                WHERE subreddit IN ({names})
+                    AND created_utc >= now() - INTERVAL {int(days)} DAY
+                    AND author != '[deleted]'
+                GROUP BY author
+                HAVING count() >= {int(min_comments)}
+            )
+            GROUP BY author
+        )
+    """
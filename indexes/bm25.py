@@ -0,0 +1,152 @@
+import re
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from mock_data import Comment
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+STOPWORDS = frozenset(
+    'a an and are as at be by for from has in is it its of on or that the to with'
+    ' your you our we i my this can will'.split()
+)
+
+K1 = 1.2
+B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    In-memory inverted index with BM25 ranking.
+    Postings are stored CSR-style: the documents containing term t are
+    doc_ids[offsets[t]:offsets[t + 1]], with their term frequencies in tfs.
+    Documents can be added at any time; new postings are buffered and merged
+    into the arrays on the next search.
+    """
+
+    def __init__(self, k1: float = K1, b: float = B):
+        self.k1 = k1
+        self.b = b
+        self.vocabulary: Dict[str, int] = {}
+        self.doc_lengths = np.zeros(0, dtype=np.int32)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.doc_ids = np.zeros(0, dtype=np.int32)
+        self.tfs = np.zeros(0, dtype=np.int32)
+        self._pending: List[tuple] = []
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Indexes a batch of documents. Returns their document ids.
+        """
+        first = len(self.doc_lengths)
+        term_ids: List[int] = []
+        lengths = np.zeros(len(texts), dtype=np.int32)
+        for i, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths[i] = len(tokens)
+            term_ids.extend(
+                self.vocabulary.setdefault(t, len(self.vocabulary)) for t in tokens
+            )
+
+        terms = np.array(term_ids, dtype=np.int64)
+        docs = np.repeat(np.arange(first, first + len(texts), dtype=np.int64), lengths)
+        # One posting per (term, doc) pair, counted
+        pairs, counts = np.unique(
+            terms * (first + len(texts)) + docs, return_counts=True
+        )
+        self._pending.append(
+            (
+                pairs // (first + len(texts)),
+                (pairs % (first + len(texts))).astype(np.int32),
+                counts.astype(np.int32),
+            )
+        )
+        self.doc_lengths = np.concatenate((self.doc_lengths, lengths))
+        return np.arange(first, first + len(texts))
+
+    def _merge(self) -> None:
+        if not self._pending:
+            return
+        existing_terms = np.repeat(
+            np.arange(len(self.offsets) - 1, dtype=np.int64), np.diff(self.offsets)
+        )
+        terms = np.concatenate([existing_terms] + [p[0] for p in self._pending])
+        docs = np.concatenate([self.doc_ids] + [p[1] for p in self._pending])
+        tfs = np.concatenate([self.tfs] + [p[2] for p in self._pending])
+        self._pending = []
+
+        # Batches only append larger doc ids, so a stable sort by term keeps
+        # each posting list in doc order
+        order = np.argsort(terms, kind='stable')
+        self.doc_ids = docs[order]
+        self.tfs = tfs[order]
+        counts = np.bincount(terms, minlength=len(self.vocabulary))
+        self.offsets = np.concatenate(([0], np.cumsum(counts)))
+
+    def scores(self, query: str) -> np.ndarray:
+        """
+        BM25 score of every document for the query (0 for no matching term).
+        """
+        self._merge()
+        n = len(self.doc_lengths)
+        scores = np.zeros(n)
+        if not n:
+            return scores
+
+        average_length = max(self.doc_lengths.mean(), 1.0)
+        norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / average_length)
+        for term in set(tokenize(query)):
+            t = self.vocabulary.get(term)
+            if t is None:
+                continue
+            start, end = self.offsets[t], self.offsets[t + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.tfs[start:end]
+            idf = np.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + norm[docs])
+        return scores
+
+    def top_per_group(self, query: str, groups: np.ndarray, n: int) -> np.ndarray:
+        """
+        Ids of the n best-scoring matching documents in each group
+        (groups[doc] is the group code of each document), best first.
+        """
+        scores = self.scores(query)
+        matching = np.nonzero(scores > 0)[0]
+        # Sort by group, then by descending score, and keep each group's head
+        order = matching[np.lexsort((-scores[matching], groups[matching]))]
+        sorted_groups = groups[order]
+        group_start = np.r_[0, np.nonzero(np.diff(sorted_groups))[0] + 1]
+        rank = np.arange(len(order)) - np.repeat(
+            group_start, np.diff(np.r_[group_start, len(order)])
+        )
+        keep = order[rank < n]
+        return keep[np.argsort(-scores[keep], kind='stable')]
+
+
+def rank_comments(
+    comments: Sequence[Comment], query: str, per_subreddit: Optional[int] = None
+) -> List[Comment]:
+    """
+    The per_subreddit comments most relevant to the query in each subreddit
+    (all of them by default), most relevant first. Comments sharing no term
+    with the query are dropped.
+    """
+    if not comments:
+        return []
+    index = BM25Index()
+    index.add([c.text for c in comments])
+
+    codes: Dict[Optional[str], int] = {}
+    groups = np.array(
+        [codes.setdefault(c.subreddit, len(codes)) for c in comments], dtype=np.int64
+    )
+    n = len(comments) if per_subreddit is None else per_subreddit
+    return [comments[i] for i in index.top_per_group(query, groups, n)]
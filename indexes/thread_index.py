@@ -0,0 +1,179 @@
+import re
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from mock_data import Comment
+
+NO_PARENT = -1
+
+# Short replies that only express agreement with their parent: an agreement
+# phrase, followed by nothing but punctuation, emoji and filler words
+AGREEMENT_RE = re.compile(
+    r'^\W*(?:\+1|same(?: here)?|this|so much this|exactly|agreed?|'
+    r'i agree|totally agree|completely agree|couldn.?t agree more|me too|'
+    r'same (?:problem|issue|experience)|came here to say this|seconded|100%)'
+    r'(?!\w)(?P<rest>.*)$',
+    re.IGNORECASE | re.DOTALL,
+)
+AGREEMENT_MAX_WORDS = 12
+# Words that add nothing to an agreement ("I agree with you 100%, well said")
+FILLER_WORDS = frozenset(
+    'a all and as i it its is me much op s so that this too very with you 100'
+    ' absolutely agree agreed completely definitely exactly great here lol man'
+    ' dude haha point right said same totally true well yeah yep yes'.split()
+)
+WORD_RE = re.compile(r'\w+')
+QUOTE_MARKER = '[quote]'
+
+
+def strip_fullname(fullname: Optional[str]) -> Optional[str]:
+    """
+    't1_abc' -> 'abc'. Returns None for submissions (t3_) and missing values.
+    """
+    if not fullname or fullname.startswith('t3_'):
+        return None
+    return fullname[3:] if fullname.startswith('t1_') else fullname
+
+
+def is_agreement(text: str) -> bool:
+    # Normalized replies keep a "[quote]" marker where the parent was quoted
+    text = text.replace(QUOTE_MARKER, ' ')
+    if len(text.split()) > AGREEMENT_MAX_WORDS:
+        return False
+    match = AGREEMENT_RE.match(text.strip())
+    return bool(match) and all(
+        word in FILLER_WORDS for word in WORD_RE.findall(match.group('rest').lower())
+    )
+
+
+class ThreadIndex:
+    """
+    Comment trees over a block of comments, stored as array-backed parent
+    pointers (position of the parent in the block, -1 for top-level comments
+    or parents outside the block) plus a CSR child list.
+    """
+
+    def __init__(self, ids: Sequence[str], parent_ids: Sequence[Optional[str]]):
+        self.ids = list(ids)
+        self.position: Dict[str, int] = {cid: i for i, cid in enumerate(self.ids)}
+
+        self.parents = np.fromiter(
+            (self.position.get(strip_fullname(pid), NO_PARENT) for pid in parent_ids),
+            dtype=np.int64,
+            count=len(self.ids),
+        )
+
+        # CSR children: children of i are child_index[child_offsets[i]:child_offsets[i + 1]]
+        has_parent = self.parents != NO_PARENT
+        child_rows = np.nonzero(has_parent)[0]
+        order = np.argsort(self.parents[child_rows], kind='stable')
+        self.child_index = child_rows[order]
+        counts = np.bincount(self.parents[child_rows], minlength=len(self.ids))
+        self.child_offsets = np.concatenate(([0], np.cumsum(counts)))
+
+    @classmethod
+    def from_comments(cls, comments: Sequence[Comment]) -> 'ThreadIndex':
+        return cls([c.id for c in comments], [c.parentId for c in comments])
+
+    def parent(self, comment_id: str) -> Optional[str]:
+        i = self.position.get(comment_id)
+        if i is None or self.parents[i] == NO_PARENT:
+            return None
+        return self.ids[self.parents[i]]
+
+    def children(self, i: int) -> np.ndarray:
+        return self.child_index[self.child_offsets[i] : self.child_offsets[i + 1]]
+
+    def ancestors(self, i: int, max_depth: int = 2) -> List[int]:
+        """
+        Positions of up to max_depth ancestors, nearest first.
+        """
+        result = []
+        current = self.parents[i]
+        while current != NO_PARENT and len(result) < max_depth:
+            result.append(int(current))
+            current = self.parents[current]
+        return result
+
+    def agreement_targets(self, agreement_mask: np.ndarray) -> np.ndarray:
+        """
+        For every agreement reply, the position of the comment it ultimately
+        agrees with (climbing through chains like "this" -> "same here" -> X).
+        -1 for comments that are not agreements or whose target is not in the block.
+        """
+        targets = np.where(agreement_mask, self.parents, NO_PARENT)
+        climbing = targets != NO_PARENT
+        climbing[climbing] = agreement_mask[targets[climbing]]
+        # Bounded by the block size so malformed parent cycles cannot spin forever
+        for _ in range(len(self.ids)):
+            if not climbing.any():
+                break
+            targets[climbing] = self.parents[targets[climbing]]
+            climbing &= targets != NO_PARENT
+            climbing[climbing] = agreement_mask[targets[climbing]]
+        return targets
+
+
+class ThreadContext:
+    """
+    Thread-aware view of a comment corpus for the LLM stages: agreement replies
+    are folded into the comment they agree with, and replies carry a compact
+    excerpt of their ancestors.
+    """
+
+    def __init__(
+        self,
+        comments: Sequence[Comment],
+        max_depth: int = 2,
+        excerpt_chars: int = 160,
+    ):
+        self.comments = list(comments)
+        self.index = ThreadIndex.from_comments(self.comments)
+        self.max_depth = max_depth
+        self.excerpt_chars = excerpt_chars
+
+        agreement_mask = np.fromiter(
+            (is_agreement(c.text) for c in self.comments),
+            dtype=bool,
+            count=len(self.comments),
+        )
+        targets = self.index.agreement_targets(agreement_mask)
+
+        # Agreements without a target in the block stay regular comments
+        self.folded = targets != NO_PARENT
+        self.agreements: Dict[str, List[Comment]] = {}
+        for i in np.nonzero(self.folded)[0]:
+            target_id = self.comments[targets[i]].id
+            self.agreements.setdefault(target_id, []).append(self.comments[i])
+
+    def prompt_comments(self) -> List[Comment]:
+        """
+        Comments that should be sent to the LLM (agreement replies are folded).
+        """
+        return [c for c, folded in zip(self.comments, self.folded) if not folded]
+
+    def _excerpt(self, text: str) -> str:
+        text = ' '.join(text.split())
+        if len(text) <= self.excerpt_chars:
+            return text
+        return text[: self.excerpt_chars - 3] + '...'
+
+    def render(self, comment: Comment) -> str:
+        line = f'ID: {comment.id}, Text: {comment.text}'
+
+        i = self.index.position[comment.id]
+        ancestors = self.index.ancestors(i, self.max_depth)
+        if ancestors:
+            chain = ' <- '.join(
+                f'"{self._excerpt(self.comments[a].text)}"' for a in ancestors
+            )
+            line += f', Replying to: {chain}'
+
+        agreeing = len(self.agreements.get(comment.id, []))
+        if agreeing:
+            line += f', Agreed by {agreeing} replies'
+        return line
+
+    def render_all(self) -> str:
+        return '\n'.join(self.render(c) for c in self.prompt_comments())
@@ -0,0 +1,358 @@
+"""
+Bulk loader for Reddit NDJSON dump files (RC_*/RS_*, zstd-compressed or plain)
+into the `comments` / `submissions` ClickHouse tables.
+
+The parent process stream-decompresses each file and hands blocks of raw lines
+to a process pool, which parses and projects them onto the table schema.
+Parsed blocks are collected into large columnar batches and inserted.
+After every insert the number of consumed lines is checkpointed to a state
+file, so an interrupted load resumes each file where it left off. Each batch
+is inserted with a deduplication token made of the file name and its line
+range, so the batch replayed after a crash between an insert and its
+checkpoint is dropped by ClickHouse instead of being loaded twice (as long as
+--block-lines and --batch-rows are unchanged between runs).
+
+Usage:
+    python -m ingest.reddit_dump RC_2024-01.zst RS_2024-01.zst --workers 16
+    python -m ingest.reddit_dump sample.ndjson --table comments --local-path ./chdata --create-table
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from db.clickhouse import ClickHouseClient
+
+SQL_DIR = Path(__file__).resolve().parent.parent / 'sql'
+
+BLOCK_LINES = 20_000
+BATCH_ROWS = 500_000
+ZSTD_WINDOW_LOG_MAX = 31  # Pushshift dumps are compressed with --long=31
+
+# Values derived from other fields when a dump record lacks them
+FIELD_FALLBACKS: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+    'name': lambda record: f't3_{record.get("id", "")}',
+}
+
+_SKIP_DEFINITIONS = ('INDEX', 'PROJECTION', 'CONSTRAINT')
+
+
+def load_table_schema(table: str) -> List[Tuple[str, str]]:
+    """
+    Reads (column, type) pairs from sql/create_<table>.sql.
+    """
+    text = (SQL_DIR / f'create_{table}.sql').read_text()
+    body = text[text.index('(') + 1 : text.index(') ENGINE')]
+
+    columns = []
+    for line in body.splitlines():
+        line = line.strip().rstrip(',')
+        if not line:
+            continue
+        name, column_type = line.split(None, 1)
+        if name.upper() in _SKIP_DEFINITIONS:
+            continue
+        columns.append((name, column_type.split(' ', 1)[0]))
+    return columns
+
+
+def _to_str(value: Any) -> str:
+    return '' if value is None else str(value)
+
+
+def _to_int(value: Any) -> int:
+    if value is None or value == '':
+        return 0
+    return int(float(value)) if isinstance(value, str) else int(value)
+
+
+def _to_float(value: Any) -> float:
+    if value is None or value == '':
+        return 0.0
+    return float(value)
+
+
+def _converter(column_type: str) -> Callable[[Any], Any]:
+    nullable = column_type.startswith('Nullable(')
+    base = column_type[len('Nullable(') : -1] if nullable else column_type
+
+    if base.startswith(('Int', 'UInt')) or base.startswith('DateTime'):
+        convert = _to_int  # DateTime is inserted as a unix timestamp
+    elif base.startswith('Float'):
+        convert = _to_float
+    else:
+        convert = _to_str
+
+    if nullable:
+        return lambda value: None if value is None else convert(value)
+    return convert
+
+
+def table_for_file(path: Path) -> Optional[str]:
+    if path.name.startswith('RC_'):
+        return 'comments'
+    if path.name.startswith('RS_'):
+        return 'submissions'
+    return None
+
+
+# Worker side
+
+_worker_projections: Dict[str, List[Tuple[str, Callable[[Any], Any]]]] = {}
+
+
+def _projection(table: str) -> List[Tuple[str, Callable[[Any], Any]]]:
+    if table not in _worker_projections:
+        _worker_projections[table] = [
+            (name, _converter(column_type))
+            for name, column_type in load_table_schema(table)
+        ]
+    return _worker_projections[table]
+
+
+def parse_block(table: str, lines: List[bytes]) -> Tuple[List[List[Any]], int]:
+    """
+    Parses a block of NDJSON lines into columns.
+    Returns the columns and the number of lines that could not be parsed.
+    """
+    projection = _projection(table)
+    columns: List[List[Any]] = [[] for _ in projection]
+    errors = 0
+
+    for line in lines:
+        try:
+            record = json.loads(line)
+            row = []
+            for name, convert in projection:
+                value = record.get(name)
+                if value is None and name in FIELD_FALLBACKS:
+                    value = FIELD_FALLBACKS[name](record)
+                row.append(convert(value))
+        except (ValueError, TypeError, AttributeError):
+            errors += 1
+            continue
+
+        for column, value in zip(columns, row):
+            column.append(value)
+
+    return columns, errors
+
+
+def _parse_block_task(args: Tuple[str, List[bytes]]) -> Tuple[List[List[Any]], int]:
+    return parse_block(*args)
+
+
+# Parent side
+
+
+class ResumeState:
+    """
+    Per-file checkpoint of consumed lines, persisted as JSON.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.files: Dict[str, Dict[str, Any]] = {}
+        if path.exists():
+            self.files = json.loads(path.read_text())
+
+    def get(self, dump: Path) -> Dict[str, Any]:
+        return self.files.get(str(dump.resolve()), {'lines': 0, 'done': False})
+
+    def update(self, dump: Path, lines: int, done: bool = False) -> None:
+        self.files[str(dump.resolve())] = {'lines': lines, 'done': done}
+        tmp = self.path.with_suffix(self.path.suffix + '.tmp')
+        tmp.write_text(json.dumps(self.files, indent=2))
+        os.replace(tmp, self.path)
+
+
+def _open_dump(path: Path):
+    raw = open(path, 'rb')
+    if path.suffix != '.zst':
+        return raw, raw
+
+    from compression import zstd
+
+    stream = zstd.ZstdFile(
+        raw,
+        options={zstd.DecompressionParameter.window_log_max: ZSTD_WINDOW_LOG_MAX},
+    )
+    return raw, stream
+
+
+def _read_blocks(stream, skip_lines: int, block_lines: int):
+    for _ in range(skip_lines):
+        if not stream.readline():
+            return
+
+    block = []
+    for line in stream:
+        block.append(line)
+        if len(block) >= block_lines:
+            yield block
+            block = []
+    if block:
+        yield block
+
+
+class DumpLoader:
+    def __init__(
+        self,
+        client: ClickHouseClient,
+        state: ResumeState,
+        workers: int = os.cpu_count() or 1,
+        block_lines: int = BLOCK_LINES,
+        batch_rows: int = BATCH_ROWS,
+    ):
+        self.client = client
+        self.state = state
+        self.workers = workers
+        self.block_lines = block_lines
+        self.batch_rows = batch_rows
+
+    def load(self, files: List[Path], table: Optional[str] = None) -> None:
+        with Pool(self.workers) as pool:
+            for path in files:
+                target = table or table_for_file(path)
+                if not target:
+                    print(f'Skipping {path}: cannot infer table, pass --table')
+                    continue
+                self.load_file(pool, path, target)
+
+    def load_file(self, pool, path: Path, table: str) -> None:
+        checkpoint = self.state.get(path)
+        if checkpoint['done']:
+            print(f'{path.name}: already loaded, skipping')
+            return
+
+        column_names = [name for name, _ in load_table_schema(table)]
+        lines_done = checkpoint['lines']
+        if lines_done:
+            print(f'{path.name}: resuming after {lines_done:,} lines')
+
+        size = path.stat().st_size
+        raw, stream = _open_dump(path)
+        started = time.monotonic()
+        rows_total = errors_total = 0
+
+        batch: List[List[Any]] = [[] for _ in column_names]
+        batch_rows = batch_lines = 0
+
+        def flush() -> None:
+            nonlocal batch, batch_rows, batch_lines, lines_done
+            if batch_rows:
+                self.client.insert_columns(
+                    table,
+                    column_names,
+                    batch,
+                    dedup_token=f'{path.name}:{lines_done}-{lines_done + batch_lines}',
+                )
+            lines_done += batch_lines
+            self.state.update(path, lines_done)
+            batch = [[] for _ in column_names]
+            batch_rows = batch_lines = 0
+
+        try:
+            # Bounded window of in-flight blocks keeps memory flat and order stable
+            pending = deque()
+            blocks = _read_blocks(stream, lines_done, self.block_lines)
+            exhausted = False
+
+            while pending or not exhausted:
+                while not exhausted and len(pending) < self.workers * 2:
+                    block = next(blocks, None)
+                    if block is None:
+                        exhausted = True
+                        break
+                    pending.append(
+                        (
+                            len(block),
+                            pool.apply_async(_parse_block_task, ((table, block),)),
+                        )
+                    )
+                if not pending:
+                    break
+
+                block_size, result = pending.popleft()
+                columns, errors = result.get()
+                for target, values in zip(batch, columns):
+                    target.extend(values)
+
+                block_rows = block_size - errors
+                batch_rows += block_rows
+                batch_lines += block_size
+                rows_total += block_rows
+                errors_total += errors
+
+                if batch_rows >= self.batch_rows:
+                    flush()
+                    self._report(
+                        path.name, raw.tell(), size, rows_total, errors_total, started
+                    )
+
+            flush()
+            self.state.update(path, lines_done, done=True)
+            self._report(path.name, size, size, rows_total, errors_total, started)
+            print()
+        finally:
+            stream.close()
+            raw.close()
+
+    @staticmethod
+    def _report(
+        name: str, position: int, size: int, rows: int, errors: int, started: float
+    ) -> None:
+        elapsed = max(time.monotonic() - started, 1e-9)
+        percent = 100.0 * position / size if size else 100.0
+        print(
+            f'\r{name}: {percent:5.1f}% | {rows:,} rows | {rows / elapsed:,.0f} rows/s'
+            f' | {errors:,} bad lines',
+            end='',
+            flush=True,
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('files', nargs='+', type=Path)
+    parser.add_argument('--table', choices=['comments', 'submissions'])
+    parser.add_argument('--clickhouse-url')
+    parser.add_argument('--database', default='default')
+    parser.add_argument('--local-path', help='Use clickhouse-local on this data path')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--block-lines', type=int, default=BLOCK_LINES)
+    parser.add_argument('--batch-rows', type=int, default=BATCH_ROWS)
+    parser.add_argument('--state', type=Path, default=Path('.ingest_state.json'))
+    parser.add_argument(
+        '--create-table', action='store_true', help='Create target tables from sql/'
+    )
+    args = parser.parse_args(argv)
+
+    client = ClickHouseClient(
+        url=args.clickhouse_url, database=args.database, local_path=args.local_path
+    )
+
+    if args.create_table:
+        tables = {args.table} if args.table else {table_for_file(f) for f in args.files}
+        for table in sorted(t for t in tables if t):
+            ddl = (SQL_DIR / f'create_{table}.sql').read_text()
+            client.command(ddl.replace('CREATE TABLE', 'CREATE TABLE IF NOT EXISTS', 1))
+
+    loader = DumpLoader(
+        client,
+        ResumeState(args.state),
+        workers=args.workers,
+        block_lines=args.block_lines,
+        batch_rows=args.batch_rows,
+    )
+    loader.load(args.files, table=args.table)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 
 from pydantic import BaseModel
 
@@ -7,6 +7,11 @@ class Subreddit(BaseModel):
     name: str
     relevance: float
     description: str
+    similarity: Optional[float] = None  # Topic similarity to the project
+    activeUsers: Optional[float] = None
+    engagementRate: Optional[float] = None
+    subscribers: Optional[int] = None
+    zone: Optional[str] = None  # 'green', 'orange' or None (see scoring.formulas)
 
 
 class Tag(BaseModel):
@@ -18,6 +23,10 @@ class User(BaseModel):
     id: str
     credibility: int
     tags: List[Tag]
+    # Inputs of the credibility score, when it was computed from activity data
+    domainKarma: Optional[int] = None
+    totalKarma: Optional[int] = None
+    accountAgeYears: Optional[float] = None
 
 
 class Comment(BaseModel):
@@ -26,6 +35,10 @@ class Comment(BaseModel):
     text: str
     score: int
     isExpert: bool
+    linkId: Optional[str] = None  # Submission fullname (t3_...)
+    parentId: Optional[str] = None  # Parent fullname (t1_... or t3_...)
+    subreddit: Optional[str] = None
+    weight: float = 1.0  # Inverse inclusion probability when sampled
 
 
 class Feature(BaseModel):
@@ -34,6 +47,15 @@ class Feature(BaseModel):
     category: str
 
 
+class ConsensusContribution(BaseModel):
+    commentId: str
+    author: Optional[str] = None
+    credibility: float  # Normalized 0-1
+    sentiment: float
+    intensity: float
+    weight: float = 1.0  # The comment's sampling weight
+
+
 class PrioritizedFeature(BaseModel):
     id: str
     title: str
@@ -42,11 +64,14 @@ class PrioritizedFeature(BaseModel):
     consensusWeight: int
     description: str
     representativeComments: List[Comment]
+    contributions: List[ConsensusContribution] = []
 
 
 class PMFReport(BaseModel):
     score: int
     summary: List[str]
+    scoreLow: Optional[int] = None  # Bootstrap confidence interval bounds
+    scoreHigh: Optional[int] = None
 
 
 # MOCK DATA from constants.ts
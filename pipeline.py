@@ -0,0 +1,411 @@
+import asyncio
+import os
+import threading
+import time
+from contextlib import aclosing
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Union,
+)
+
+from pydantic import BaseModel
+
+from agents.author_filter import AuthorFilterStats
+from agents.llm import LLMClient
+from agents.normalization import NormalizationStats, Normalizer
+from agents.product_analyst_agent import ProductAnalystAgent
+from agents.profiler_agent import ProfilerAgent
+from agents.profiler_worker import profile_sharded
+from agents.request_policy import call_with_deadline, iter_with_deadline
+from agents.sampling import StratifiedSampler
+from agents.scout_agent import ScoutAgent
+from agents.telemetry import Telemetry
+from indexes.thread_index import is_agreement
+from mock_data import Comment, Feature, PMFReport, PrioritizedFeature, Subreddit, User
+
+PROFILE_CONCURRENCY = 8
+TOP_OPINIONS = 3
+
+
+class StageStarted(BaseModel):
+    type: Literal['stage_started'] = 'stage_started'
+    stage: str
+
+
+class SubredditsRanked(BaseModel):
+    type: Literal['subreddits_ranked'] = 'subreddits_ranked'
+    subreddits: List[Subreddit]  # Every candidate, best first
+
+
+class SubredditFound(BaseModel):
+    type: Literal['subreddit_found'] = 'subreddit_found'
+    subreddit: Subreddit
+
+
+class AuthorsFiltered(BaseModel):
+    type: Literal['authors_filtered'] = 'authors_filtered'
+    stats: AuthorFilterStats
+
+
+class UserProfiled(BaseModel):
+    type: Literal['user_profiled'] = 'user_profiled'
+    user: User
+
+
+class OpinionsNormalized(BaseModel):
+    type: Literal['opinions_normalized'] = 'opinions_normalized'
+    stats: NormalizationStats
+
+
+class OpinionsMined(BaseModel):
+    type: Literal['opinions_mined'] = 'opinions_mined'
+    total: int
+    topComments: List[Comment]
+    sampled: Optional[int] = None  # Size of the weighted sample analyzed, if any
+
+
+class FeatureExtracted(BaseModel):
+    type: Literal['feature_extracted'] = 'feature_extracted'
+    feature: Feature
+
+
+class WeightUpdated(BaseModel):
+    type: Literal['weight_updated'] = 'weight_updated'
+    feature: PrioritizedFeature
+
+
+class ReportReady(BaseModel):
+    type: Literal['report_ready'] = 'report_ready'
+    report: PMFReport
+
+
+PipelineEvent = Union[
+    StageStarted,
+    SubredditsRanked,
+    SubredditFound,
+    AuthorsFiltered,
+    UserProfiled,
+    OpinionsNormalized,
+    OpinionsMined,
+    FeatureExtracted,
+    WeightUpdated,
+    ReportReady,
+]
+
+
+def to_sse(event: PipelineEvent) -> str:
+    """
+    Serializes an event as a Server-Sent Events message.
+    """
+    return f'event: {event.type}\ndata: {event.model_dump_json()}\n\n'
+
+
+def print_event(event: PipelineEvent) -> None:
+    """
+    Renders pipeline events as they arrive.
+    """
+    if isinstance(event, StageStarted):
+        print(f'\n--- {event.stage} ---')
+    elif isinstance(event, SubredditFound):
+        sub = event.subreddit
+        zone = f' ({sub.zone.title()} zone)' if sub.zone else ''
+        print(f'[{sub.relevance}] {sub.name}{zone} - {sub.description}')
+    elif isinstance(event, AuthorsFiltered):
+        stats = event.stats
+        print(
+            f'Vetted {stats.authors} authors: kept {stats.kept}'
+            f' (rejected {stats.bot_names} bot names, {stats.regular_intervals} regular'
+            f' intervals, {stats.uniform_lengths} uniform lengths, {stats.duplicates}'
+            f' duplicates, {stats.distinguished} distinguished, {stats.controversial}'
+            f' controversial, {stats.too_new} too new)'
+        )
+    elif isinstance(event, UserProfiled):
+        user = event.user
+        tags_str = ', '.join([t.label for t in user.tags])
+        print(f'User: {user.id} (Credibility: {user.credibility}) | Tags: [{tags_str}]')
+    elif isinstance(event, OpinionsNormalized):
+        stats = event.stats
+        print(
+            f'Normalized {stats.comments} comments: kept {stats.kept}'
+            f' (dropped {stats.deleted} deleted, {stats.bots} bot, {stats.too_short} too short,'
+            f' {stats.other_language} other language), ~{stats.tokens_saved} tokens saved'
+        )
+    elif isinstance(event, OpinionsMined):
+        sampled = (
+            f' (analyzing a weighted sample of {event.sampled})'
+            if event.sampled
+            else ''
+        )
+        print(f'Mined {event.total} opinions{sampled}. Top Opinions:')
+        for c in event.topComments:
+            print(f'Score: {c.score} | {c.author}: {c.text[:100]}...')
+    elif isinstance(event, FeatureExtracted):
+        print(f'- {event.feature.title} ({event.feature.category})')
+    elif isinstance(event, WeightUpdated):
+        pf = event.feature
+        print(f'Feature: {pf.title}')
+        print(f'  Consensus Weight: {pf.consensusWeight}')
+        print(f'  Related Comments: {pf.linkedComments}')
+    elif isinstance(event, ReportReady):
+        print('PMF REPORT')
+        print('==========')
+        print(f'PMF Confidence Score: {event.report.score}/100')
+        if event.report.scoreLow is not None:
+            print(f'90% interval: {event.report.scoreLow}-{event.report.scoreHigh}/100')
+        print('Key Validation Points:')
+        for point in event.report.summary:
+            print(f'* {point}')
+
+
+async def iterate_in_thread(
+    factory: Callable[..., Iterator[Any]], *args: Any
+) -> AsyncIterator[Any]:
+    """
+    Drives a blocking iterator in a worker thread and yields its items
+    to the event loop as they are produced. When the consumer stops early
+    (aclose, client disconnect), the worker stops at the next item and
+    closes the iterator, so no further calls are made on its behalf; closing
+    returns once the worker thread has stopped.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+    stop = threading.Event()
+
+    def produce() -> None:
+        iterator = factory(*args)
+        try:
+            for item in iterator:
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+            if not stop.is_set():
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    producer = asyncio.ensure_future(asyncio.to_thread(produce))
+    try:
+        while (item := await queue.get()) is not done:
+            yield item
+        await producer
+    finally:
+        if not producer.done():
+            stop.set()
+            await asyncio.shield(producer)
+
+
+class ValidationPipeline:
+    """
+    Runs the Scout -> Profiler -> Analyst pipeline as an async event stream,
+    so clients can render partial results as soon as each one exists.
+    Agent calls are blocking and run in worker threads.
+    """
+
+    def __init__(
+        self,
+        scout: Optional[ScoutAgent] = None,
+        profiler: Optional[ProfilerAgent] = None,
+        analyst: Optional[ProductAnalystAgent] = None,
+        telemetry: Optional[Telemetry] = None,
+        normalizer: Optional[Normalizer] = None,
+        sampler: Optional[StratifiedSampler] = None,
+        profile_queue_dir: Optional[str] = None,
+        llm: Optional[LLMClient] = None,
+    ):
+        self.telemetry = telemetry or (llm.telemetry if llm else Telemetry())
+        self.normalizer = normalizer or Normalizer()
+        self.sampler = sampler or StratifiedSampler()
+        # Profiling runs in sharded worker processes when a queue directory is set
+        self.profile_queue_dir = profile_queue_dir or os.getenv('PROFILE_QUEUE_DIR')
+        if llm is None and not (profiler and analyst):
+            llm = LLMClient(self.telemetry)
+        self.scout = scout or ScoutAgent()
+        self.profiler = profiler or ProfilerAgent(llm=llm)
+        self.analyst = analyst or ProductAnalystAgent(llm=llm)
+
+    async def _profile_users(
+        self, users: List[User], comments: List[Comment], deadline: Optional[float]
+    ) -> AsyncIterator[User]:
+        if self.profile_queue_dir:
+            # Worker processes cannot report profiles one by one; all arrive at once
+            timeout = deadline - time.monotonic() if deadline else None
+            for user in await asyncio.to_thread(
+                profile_sharded,
+                users,
+                comments,
+                self.profile_queue_dir,
+                timeout=timeout,
+                telemetry=self.telemetry,
+            ):
+                yield user
+            return
+
+        semaphore = asyncio.Semaphore(PROFILE_CONCURRENCY)
+        stopped = False
+
+        async def profile(user: User) -> User:
+            async with semaphore:
+                if stopped:
+                    return user
+                return await asyncio.to_thread(
+                    call_with_deadline,
+                    deadline,
+                    self.profiler.enrich_user,
+                    user,
+                    comments,
+                )
+
+        tasks = [asyncio.ensure_future(profile(u)) for u in users]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Users still waiting for a slot are never sent to the LLM, and
+            # closing waits for the calls already in flight
+            stopped = True
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def run(
+        self, project_description: str, timeout: Optional[float] = None
+    ) -> AsyncIterator[PipelineEvent]:
+        """
+        With a timeout, every LLM call is bounded by what is left of the run
+        deadline; stages reached after it return empty results promptly.
+        """
+        deadline = time.monotonic() + timeout if timeout else None
+
+        yield StageStarted(stage='Scout Agent: Selecting relevant subreddits')
+        candidates = await asyncio.to_thread(
+            call_with_deadline,
+            deadline,
+            self.scout.rank_subreddits,
+            project_description,
+        )
+        yield SubredditsRanked(subreddits=candidates)
+        subreddits = self.scout.target_subreddits(candidates)
+        for subreddit in subreddits:
+            yield SubredditFound(subreddit=subreddit)
+        if not subreddits:
+            # Nothing to mine; an empty analysis would only look like a verdict
+            yield ReportReady(
+                report=PMFReport(
+                    score=0,
+                    summary=[
+                        'No relevant communities were found for this idea, so'
+                        ' there are no opinions to analyze.',
+                        'Try describing the problem it solves or its audience'
+                        ' in more detail.',
+                    ],
+                )
+            )
+            return
+
+        yield StageStarted(stage='Scout Agent: Selecting credible users')
+        vetting = await asyncio.to_thread(
+            call_with_deadline, deadline, self.scout.vet_authors, subreddits
+        )
+        yield AuthorsFiltered(stats=vetting.stats)
+        # Profiling tags users in place; copies keep concurrent runs independent
+        users = [user.model_copy(deep=True) for user in vetting.users]
+
+        yield StageStarted(stage='Scout Agent: Mining opinions')
+        mined = await asyncio.to_thread(
+            call_with_deadline,
+            deadline,
+            self.scout.mine_opinions,
+            project_description,
+            subreddits,
+        )
+        # Comments by authors the filter rejected never reach the analyst
+        mined = [c for c in mined if c.author not in vetting.rejected]
+        # Markdown, quotes, deleted, bot, too-short and foreign-language
+        # comments are cleaned out before ranking and before any LLM call
+        normalized, normalization = await asyncio.to_thread(
+            self.normalizer.normalize, mined
+        )
+        ranked = await asyncio.to_thread(
+            self.scout.rank_opinions, project_description, normalized
+        )
+        # A weighted stratified sample bounds what profiling and the analyst
+        # stages see, however many comments match
+        comments = await asyncio.to_thread(self.sampler.sample, ranked, users)
+        # Agreement replies to the sampled comments never match the keywords,
+        # so they are fetched by thread; the analyst folds them into consensus
+        replies = await asyncio.to_thread(
+            call_with_deadline, deadline, self.scout.agreement_replies, comments
+        )
+        replies, _ = await asyncio.to_thread(self.normalizer.normalize, replies)
+        corpus = comments + [
+            r
+            for r in replies
+            if r.author not in vetting.rejected and is_agreement(r.text)
+        ]
+
+        yield OpinionsNormalized(stats=normalization)
+        top_comments = sorted(ranked, key=lambda x: x.score, reverse=True)
+        yield OpinionsMined(
+            total=len(ranked),
+            topComments=top_comments[:TOP_OPINIONS],
+            sampled=len(comments) if len(comments) < len(ranked) else None,
+        )
+
+        yield StageStarted(stage='Profiler Agent: Profiling users')
+        # Profiles arrive in completion order; downstream keeps the selection order
+        profiled = {}
+        async with aclosing(self._profile_users(users, comments, deadline)) as stream:
+            async for user in stream:
+                profiled[user.id] = user
+                yield UserProfiled(user=user)
+        enriched_users = [profiled[u.id] for u in users]
+
+        yield StageStarted(stage='Product Analyst Agent: Mining features')
+        # Features and weights are emitted while the model is still generating
+        features = []
+        async with aclosing(
+            iterate_in_thread(
+                iter_with_deadline,
+                deadline,
+                self.analyst.iter_features,
+                corpus,
+                project_description,
+            )
+        ) as stream:
+            async for feature in stream:
+                features.append(feature)
+                yield FeatureExtracted(feature=feature)
+
+        yield StageStarted(stage='Product Analyst Agent: Prioritizing features')
+        prioritized_features = []
+        async with aclosing(
+            iterate_in_thread(
+                iter_with_deadline,
+                deadline,
+                self.analyst.iter_prioritized_features,
+                features,
+                corpus,
+                enriched_users,
+            )
+        ) as stream:
+            async for prioritized in stream:
+                prioritized_features.append(prioritized)
+                yield WeightUpdated(feature=prioritized)
+        prioritized_features.sort(key=lambda x: x.consensusWeight, reverse=True)
+
+        yield StageStarted(stage='Product Analyst Agent: Validating the idea')
+        report = await asyncio.to_thread(
+            call_with_deadline,
+            deadline,
+            self.analyst.validate_idea,
+            prioritized_features,
+            project_description,
+        )
+        yield ReportReady(report=report)
@@ -0,0 +1,68 @@
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+from scoring.vectorized import calculate_pmf_probability
+
+N_RESAMPLES = 2000
+CONFIDENCE = 0.9
+TOP_K = 5
+# Upper bound on resample x contribution cells held in memory at once
+MAX_CELLS = 4_000_000
+
+
+def bootstrap_top_weights(
+    contributions: Sequence[Sequence[float]],
+    n_resamples: int = N_RESAMPLES,
+    top_k: int = TOP_K,
+    seed: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Bootstrap distribution of Avg(W_top5).
+    Each feature's consensus weight is re-summed from its per-comment
+    contributions resampled with replacement, then the top-k features are
+    re-selected per resample. Returns one value per resample.
+    """
+    sizes = np.array([len(c) for c in contributions], dtype=np.int64)
+    if not len(sizes) or not sizes.sum():
+        return np.zeros(n_resamples)
+
+    values = np.concatenate([np.asarray(c, dtype=np.float64) for c in contributions])
+    offsets = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    feature_of = np.repeat(np.arange(len(sizes)), sizes)
+
+    # reduceat needs non-empty segments; empty features keep a zero weight
+    nonempty = sizes > 0
+    k = min(top_k, len(sizes))
+    rng = np.random.default_rng(seed)
+
+    chunk = max(1, MAX_CELLS // len(values))
+    result = np.empty(n_resamples)
+    for start in range(0, n_resamples, chunk):
+        b = min(chunk, n_resamples - start)
+        # Resample within each feature: position = offset + floor(U * size)
+        picks = offsets[feature_of] + (
+            rng.random((b, len(values))) * sizes[feature_of]
+        ).astype(np.int64)
+        weights = np.zeros((b, len(sizes)))
+        weights[:, nonempty] = np.add.reduceat(values[picks], offsets[nonempty], axis=1)
+        top = -np.partition(-weights, k - 1, axis=1)[:, :k]
+        result[start : start + b] = top.mean(axis=1)
+    return result
+
+
+def bootstrap_pmf_interval(
+    contributions: Sequence[Sequence[float]],
+    total_volume: float,
+    n_resamples: int = N_RESAMPLES,
+    confidence: float = CONFIDENCE,
+    seed: Optional[int] = None,
+) -> Tuple[int, int]:
+    """
+    Percentile bootstrap interval of the PMF score (0-100).
+    """
+    avg_top = bootstrap_top_weights(contributions, n_resamples, seed=seed)
+    pmf = calculate_pmf_probability(avg_top, total_volume)
+    tail = (1.0 - confidence) / 2.0 * 100
+    low, high = np.percentile(pmf, [tail, 100 - tail])
+    return int(low), int(high)
@@ -1,14 +1,29 @@
 import math
-from typing import List
+from typing import List, Optional
 
 # Constants for Subreddit Relevance
 W1 = 0.6  # Weight for Similarity
 W2 = 0.2  # Weight for Active Users
 W3 = 0.2  # Weight for Engagement Rate
 
+# Rs is reported on a 0-10 scale
+RELEVANCE_SCALE = 10.0
+# Factor values scoring full marks. Each factor is scaled against a fixed
+# reference (capped at 1), so a zone means the same thing in every run
+SIMILARITY_REF = 0.3
+ACTIVE_USERS_REF = 100_000
+ENGAGEMENT_REF = 20.0
+
+# Relevance zones
+GREEN_ZONE = 9.0  # Rs at or above: target communities
+ORANGE_ZONE = 8.0  # Rs at or above: exploratory options
+
 # Constants for User Credibility
 EPSILON = 1.0
 LAMBDA = 0.5
+# Credibility (0-100) of authors outside the vetted users: unvetted comments
+# count for less than those of a vetted author with a few years of history
+UNKNOWN_CREDIBILITY = 20
 
 # Constants for PMF Score
 ALPHA = 0.1
@@ -17,19 +32,29 @@ DELTA = 5.0
 
 
 def calculate_subreddit_relevance(
-    similarity: float, active_users: int, engagement_rate: float
+    similarity: float, activity: float, engagement: float
 ) -> float:
     """
-    Calculates Subreddit Relevance Index (Rs).
-    Rs = w1 * Sim + w2 * log(Active) + w3 * Engagement
+    Calculates Subreddit Relevance Index (Rs) from factors already scaled to
+    0-1 against their reference values (see scoring.vectorized).
+    Rs = 10 * (w1 * Sim + w2 * log(Active) + w3 * log(1 + Engagement))
     """
-    # Avoid log(0)
-    log_active = math.log(active_users) if active_users > 1 else 0
-
-    rs = (W1 * similarity) + (W2 * log_active) + (W3 * engagement_rate)
+    rs = RELEVANCE_SCALE * ((W1 * similarity) + (W2 * activity) + (W3 * engagement))
     return round(rs, 2)
 
 
+def relevance_zone(relevance: float) -> Optional[str]:
+    """
+    'green' for target communities, 'orange' for exploratory options,
+    None for communities below both thresholds.
+    """
+    if relevance >= GREEN_ZONE:
+        return 'green'
+    if relevance >= ORANGE_ZONE:
+        return 'orange'
+    return None
+
+
 def calculate_user_credibility(
     domain_karma: int, total_karma: int, account_age_years: float, badges_weight: float
 ) -> float:
@@ -0,0 +1,378 @@
+"""
+Offline what-if engine for the scoring constants.
+
+A completed run is saved as a snapshot: every candidate subreddit with its
+similarity / activity inputs, the karma and account-age inputs of every
+scored author, and every prioritized feature with the per-comment
+credibility, sentiment, intensity and sampling weight behind its consensus
+weight.
+From a snapshot, subreddit rankings, Green/Orange zones, feature rankings and
+the PMF score are recomputed for a whole grid of parameter values without any
+LLM call. Each chunk of the grid is evaluated as a handful of broadcast array
+operations (parameter combinations x items) and chunks run in a process pool.
+
+Credibility constants (EPSILON, LAMBDA) only affect authors whose karma and
+account-age inputs are recorded in the snapshot; other authors (demo data,
+unknown authors) keep the credibility they had in the run. Sweeping them over
+a snapshot without any such inputs is rejected.
+
+Usage:
+    python -m scoring.sweep run.json --grid W1=0.4:0.8:9 --grid ALPHA=0.05,0.1,0.2
+    python -m scoring.sweep run.json --grid DELTA=2:8:61 --target-score 72
+"""
+
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from pydantic import BaseModel
+
+from mock_data import PrioritizedFeature, Subreddit
+from scoring import formulas
+from scoring.vectorized import (
+    calculate_pmf_probability,
+    calculate_user_credibility,
+    relevance_factors,
+)
+
+PARAMETERS = [
+    'W1',
+    'W2',
+    'W3',
+    'GREEN_ZONE',
+    'ORANGE_ZONE',
+    'EPSILON',
+    'LAMBDA',
+    'ALPHA',
+    'BETA',
+    'DELTA',
+]
+TOP_K = 5
+# Upper bound on combination x item cells held in memory at once per worker
+MAX_CELLS = 4_000_000
+
+
+class CredibilityInputs(BaseModel):
+    domainKarma: int
+    totalKarma: int
+    accountAgeYears: float
+    badgesWeight: float = 0.0
+
+
+class RunSnapshot(BaseModel):
+    projectDescription: str
+    subreddits: List[Subreddit]
+    features: List[PrioritizedFeature]
+    # Keyed by author; authors without inputs keep their run credibility
+    credibilityInputs: Dict[str, CredibilityInputs] = {}
+
+    @classmethod
+    def from_events(cls, project_description: str, events: Iterable) -> 'RunSnapshot':
+        """
+        Collects a snapshot from the events of a ValidationPipeline run.
+        """
+        subreddits, features = [], []
+        credibility_inputs = {}
+        for event in events:
+            if event.type == 'subreddits_ranked':
+                subreddits = list(event.subreddits)
+            elif event.type == 'user_profiled' and event.user.domainKarma is not None:
+                user = event.user
+                credibility_inputs[user.id] = CredibilityInputs(
+                    domainKarma=user.domainKarma,
+                    totalKarma=user.totalKarma,
+                    accountAgeYears=user.accountAgeYears,
+                )
+            elif event.type == 'weight_updated':
+                features.append(event.feature)
+        return cls(
+            projectDescription=project_description,
+            subreddits=subreddits,
+            features=features,
+            credibilityInputs=credibility_inputs,
+        )
+
+    def save(self, path: str) -> None:
+        Path(path).write_text(self.model_dump_json(indent=2))
+
+    @classmethod
+    def load(cls, path: str) -> 'RunSnapshot':
+        return cls.model_validate_json(Path(path).read_text())
+
+
+class SweepArrays:
+    """
+    The snapshot flattened into the arrays the sweep broadcasts over.
+    """
+
+    def __init__(self, snapshot: RunSnapshot):
+        # Subreddits that lack stats (demo data) cannot be re-ranked
+        subreddits = [
+            s
+            for s in snapshot.subreddits
+            if s.similarity is not None
+            and s.activeUsers is not None
+            and s.engagementRate is not None
+        ]
+        self.subreddit_names = [s.name for s in subreddits]
+        # Factor scaling does not depend on the weights, so it is done once
+        self.similarity, self.activity, self.engagement = relevance_factors(
+            [s.similarity for s in subreddits],
+            [s.activeUsers for s in subreddits],
+            [s.engagementRate for s in subreddits],
+        )
+
+        authors = sorted(snapshot.credibilityInputs)
+        slots = {author: i for i, author in enumerate(authors)}
+        inputs = [snapshot.credibilityInputs[a] for a in authors]
+        self.domain_karma = np.array([u.domainKarma for u in inputs], dtype=np.float64)
+        self.total_karma = np.array([u.totalKarma for u in inputs], dtype=np.float64)
+        self.account_age = np.array([u.accountAgeYears for u in inputs])
+        self.badges = np.array([u.badgesWeight for u in inputs])
+
+        self.feature_titles = [f.title for f in snapshot.features]
+        contributions = [c for f in snapshot.features for c in f.contributions]
+        self.sizes = np.array([len(f.contributions) for f in snapshot.features])
+        self.offsets = np.concatenate(([0], np.cumsum(self.sizes)[:-1])).astype(
+            np.int64
+        )
+        self.slot = np.array(
+            [slots.get(c.author, -1) for c in contributions], dtype=np.int64
+        )
+        self.fixed_credibility = np.array([c.credibility for c in contributions])
+        self.sentiment_intensity = np.array(
+            [c.sentiment * c.intensity * c.weight for c in contributions]
+        )
+        self.total_volume = sum(f.linkedComments for f in snapshot.features)
+
+
+def parameter_grid(values: Dict[str, List[float]]) -> Dict[str, np.ndarray]:
+    """
+    Cartesian product of the given values; other parameters keep their
+    current value in scoring.formulas.
+    """
+    unknown = set(values) - set(PARAMETERS)
+    if unknown:
+        raise ValueError(f'Unknown parameters: {", ".join(sorted(unknown))}')
+    axes = [values.get(name, [getattr(formulas, name)]) for name in PARAMETERS]
+    combos = np.array(list(itertools.product(*axes)), dtype=np.float64)
+    return {name: combos[:, i] for i, name in enumerate(PARAMETERS)}
+
+
+def evaluate(arrays: SweepArrays, grid: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Scores every parameter combination in the grid. Returns per combination:
+    Green/Orange zone counts, the subreddit and feature rankings (top indices)
+    and the PMF score, each computed as in the live pipeline.
+    """
+    p = {name: grid[name][:, None] for name in PARAMETERS}
+    n = len(grid['W1'])
+
+    relevance = np.round(
+        formulas.RELEVANCE_SCALE
+        * (
+            p['W1'] * arrays.similarity
+            + p['W2'] * arrays.activity
+            + p['W3'] * arrays.engagement
+        ),
+        2,
+    )
+    green = relevance >= p['GREEN_ZONE']
+    orange = (relevance >= p['ORANGE_ZONE']) & ~green
+    top_subreddits = np.argsort(-relevance, axis=1, kind='stable')[:, :TOP_K]
+
+    credibility = np.broadcast_to(arrays.fixed_credibility, (n, len(arrays.slot)))
+    if len(arrays.domain_karma):
+        cu = calculate_user_credibility(
+            arrays.domain_karma,
+            arrays.total_karma,
+            arrays.account_age,
+            arrays.badges,
+            p['EPSILON'],
+            p['LAMBDA'],
+        )
+        # Users carry their credibility as a 0-100 int
+        cu = np.round(cu * 100) / 100
+        known = arrays.slot >= 0
+        credibility = np.where(known, cu[:, np.maximum(arrays.slot, 0)], credibility)
+
+    weights = np.zeros((n, len(arrays.sizes)))
+    nonempty = arrays.sizes > 0
+    if nonempty.any():
+        weights[:, nonempty] = np.add.reduceat(
+            credibility * arrays.sentiment_intensity * 100,
+            arrays.offsets[nonempty],
+            axis=1,
+        )
+    # Consensus weights are reported as truncated ints
+    weights = np.trunc(weights)
+    top_features = np.argsort(-weights, axis=1, kind='stable')[:, :TOP_K]
+
+    if len(arrays.sizes):
+        avg_top = np.take_along_axis(weights, top_features, axis=1).mean(axis=1)
+        pmf = np.floor(
+            calculate_pmf_probability(
+                avg_top,
+                arrays.total_volume,
+                grid['ALPHA'],
+                grid['BETA'],
+                grid['DELTA'],
+            )
+        ).astype(np.int64)
+    else:
+        pmf = np.zeros(n, dtype=np.int64)
+
+    return {
+        'green': green.sum(axis=1),
+        'orange': orange.sum(axis=1),
+        'top_subreddits': top_subreddits,
+        'top_features': top_features,
+        'pmf': pmf,
+    }
+
+
+_worker_arrays: Optional[SweepArrays] = None
+
+
+def _init_worker(arrays: SweepArrays) -> None:
+    global _worker_arrays
+    _worker_arrays = arrays
+
+
+def _evaluate_chunk(grid: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    return evaluate(_worker_arrays, grid)
+
+
+class SweepResult:
+    def __init__(
+        self,
+        arrays: SweepArrays,
+        grid: Dict[str, np.ndarray],
+        outputs: Dict[str, np.ndarray],
+    ):
+        self.arrays = arrays
+        self.grid = grid
+        self.outputs = outputs
+
+    def __len__(self) -> int:
+        return len(self.outputs['pmf'])
+
+    def row(self, i: int) -> Dict:
+        return {
+            'params': {name: float(self.grid[name][i]) for name in PARAMETERS},
+            'pmf': int(self.outputs['pmf'][i]),
+            'green': int(self.outputs['green'][i]),
+            'orange': int(self.outputs['orange'][i]),
+            'subreddits': [
+                self.arrays.subreddit_names[j]
+                for j in self.outputs['top_subreddits'][i]
+            ],
+            'features': [
+                self.arrays.feature_titles[j] for j in self.outputs['top_features'][i]
+            ],
+        }
+
+    def closest(self, target_score: int, n: int = 10) -> List[Dict]:
+        """
+        The n combinations whose PMF score is closest to an observed outcome.
+        """
+        order = np.argsort(np.abs(self.outputs['pmf'] - target_score), kind='stable')
+        return [self.row(i) for i in order[:n]]
+
+
+def sweep(
+    snapshot: RunSnapshot,
+    grid: Dict[str, np.ndarray],
+    processes: int = 1,
+) -> SweepResult:
+    """
+    Evaluates the grid in chunks, across a process pool when processes > 1.
+    """
+    if not snapshot.credibilityInputs:
+        swept = [
+            name
+            for name in ('EPSILON', 'LAMBDA')
+            if len(np.unique(grid[name])) > 1
+            or grid[name][0] != getattr(formulas, name)
+        ]
+        if swept:
+            raise ValueError(
+                f'{", ".join(swept)} cannot be swept: the snapshot has no'
+                ' credibility inputs'
+            )
+    arrays = SweepArrays(snapshot)
+    total = len(grid['W1'])
+    width = max(len(arrays.slot), len(arrays.subreddit_names), 1)
+    chunk = max(1, min(MAX_CELLS // width, -(-total // max(processes, 1))))
+    chunks = [
+        {name: values[start : start + chunk] for name, values in grid.items()}
+        for start in range(0, total, chunk)
+    ]
+
+    if processes > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(
+            processes, initializer=_init_worker, initargs=(arrays,)
+        ) as pool:
+            results = list(pool.map(_evaluate_chunk, chunks))
+    else:
+        results = [evaluate(arrays, c) for c in chunks]
+
+    outputs = {key: np.concatenate([r[key] for r in results]) for key in results[0]}
+    return SweepResult(arrays, grid, outputs)
+
+
+def parse_axis(spec: str) -> List[float]:
+    """
+    "start:stop:count" for an inclusive linear range, or "a,b,c".
+    """
+    if ':' in spec:
+        start, stop, count = spec.split(':')
+        return list(np.linspace(float(start), float(stop), int(count)))
+    return [float(v) for v in spec.split(',')]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='Scoring what-if sweep')
+    parser.add_argument('snapshot')
+    parser.add_argument(
+        '--grid',
+        action='append',
+        default=[],
+        metavar='NAME=VALUES',
+        help='e.g. W1=0.4:0.8:9 or ALPHA=0.05,0.1',
+    )
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--target-score', type=int)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    values = {}
+    for item in args.grid:
+        name, spec = item.split('=', 1)
+        values[name.upper()] = parse_axis(spec)
+    grid = parameter_grid(values)
+
+    started = time.perf_counter()
+    result = sweep(RunSnapshot.load(args.snapshot), grid, args.processes)
+    elapsed = time.perf_counter() - started
+    print(
+        f'Evaluated {len(result):,} combinations in {elapsed:.2f}s'
+        f' ({len(result) / max(elapsed, 1e-9):,.0f}/s)'
+    )
+
+    if args.target_score is not None:
+        rows = result.closest(args.target_score, args.top)
+    else:
+        rows = [result.row(i) for i in range(min(args.top, len(result)))]
+    for row in rows:
+        print(json.dumps(row))
+
+
+if __name__ == '__main__':
+    main()
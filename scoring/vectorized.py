@@ -0,0 +1,105 @@
+from typing import Tuple
+
+import numpy as np
+
+from scoring.formulas import (
+    ACTIVE_USERS_REF,
+    ALPHA,
+    BETA,
+    DELTA,
+    ENGAGEMENT_REF,
+    EPSILON,
+    LAMBDA,
+    RELEVANCE_SCALE,
+    SIMILARITY_REF,
+    W1,
+    W2,
+    W3,
+)
+
+
+def scaled(values: np.ndarray, reference: float) -> np.ndarray:
+    """
+    Values as a share of the reference, clipped to 0-1.
+    """
+    return np.clip(np.asarray(values, dtype=np.float64) / reference, 0.0, 1.0)
+
+
+def relevance_factors(
+    similarity: np.ndarray, active_users: np.ndarray, engagement_rate: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    The three Rs factors, each scaled to 0-1 against a fixed reference:
+    similarity, log(Active) and log(1 + Engagement). Scaling keeps raw activity
+    and comments per post from drowning out topic similarity, and unlike
+    scaling across the candidates it keeps near-ties close.
+    """
+    # Avoid log(0)
+    log_active = np.log(np.maximum(np.asarray(active_users, dtype=np.float64), 1.0))
+    log_engagement = np.log1p(
+        np.maximum(np.asarray(engagement_rate, dtype=np.float64), 0.0)
+    )
+    return (
+        scaled(similarity, SIMILARITY_REF),
+        scaled(log_active, np.log(ACTIVE_USERS_REF)),
+        scaled(log_engagement, np.log1p(ENGAGEMENT_REF)),
+    )
+
+
+def calculate_subreddit_relevance(
+    similarity: np.ndarray,
+    active_users: np.ndarray,
+    engagement_rate: np.ndarray,
+    w1: float = W1,
+    w2: float = W2,
+    w3: float = W3,
+) -> np.ndarray:
+    """
+    Vectorized Subreddit Relevance Index (Rs) over a set of candidate communities.
+    Rs = 10 * (w1 * Sim + w2 * log(Active) + w3 * log(1 + Engagement)),
+    with each factor scaled against its reference value.
+    """
+    sim, activity, engagement = relevance_factors(
+        similarity, active_users, engagement_rate
+    )
+    rs = RELEVANCE_SCALE * ((w1 * sim) + (w2 * activity) + (w3 * engagement))
+    return np.round(rs, 2)
+
+
+def calculate_user_credibility(
+    domain_karma: np.ndarray,
+    total_karma: np.ndarray,
+    account_age_years: np.ndarray,
+    badges_weight: np.ndarray,
+    epsilon: float = EPSILON,
+    lambda_: float = LAMBDA,
+) -> np.ndarray:
+    """
+    Vectorized User Credibility Score (Cu) over many authors at once, clamped to 0-1.
+    Cu = (K_domain / (K_total + epsilon)) * (1 - e^(-lambda * T_age)) + Sum(Badges)
+    """
+    domain_karma = np.asarray(domain_karma, dtype=np.float64)
+    total_karma = np.asarray(total_karma, dtype=np.float64)
+    account_age_years = np.asarray(account_age_years, dtype=np.float64)
+
+    cu = (domain_karma / (total_karma + epsilon)) * (
+        1 - np.exp(-lambda_ * account_age_years)
+    ) + badges_weight
+    return np.clip(cu, 0.0, 1.0)
+
+
+def calculate_pmf_probability(
+    avg_top_weight: np.ndarray,
+    total_volume: np.ndarray,
+    alpha: float = ALPHA,
+    beta: float = BETA,
+    delta: float = DELTA,
+) -> np.ndarray:
+    """
+    Vectorized PMF sigmoid, as a float 0-100 (calculate_pmf_score truncates to int).
+    PMF = 1 / (1 + e^-(alpha * Avg(W_top5) + beta * Vol - delta)) * 100
+    """
+    x = alpha * np.asarray(avg_top_weight, dtype=np.float64)
+    x = x + beta * np.asarray(total_volume, dtype=np.float64) - delta
+    # tanh form of the logistic function cannot overflow
+    return 50.0 * (1.0 + np.tanh(x / 2.0))
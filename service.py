@@ -0,0 +1,400 @@
+"""
+Long-running HTTP service mode.
+
+One process keeps the pipeline warm across requests: agents, the shared
+OpenAI client and its connection pool, the ClickHouse connection pool, the
+scout's activity stats and the analyst's rendered corpora. Each validation
+streams its events back as Server-Sent Events and gets its own telemetry.
+Admission control bounds concurrent validations; requests beyond the queue
+are rejected with 503 instead of degrading every run in flight.
+
+Endpoints:
+    POST /validate  {"projectDescription": "...", "timeout": 120}  -> text/event-stream
+    GET  /health    -> active / queued validations and capacity
+    GET  /usage     -> LLM usage since the service started
+
+Usage:
+    python service.py serve --port 8000 --max-active 4
+    python service.py validate "An app that ..." --port 8000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Annotated, AsyncIterator, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+
+from agents.llm import LLMClient
+from agents.scout_agent import ScoutAgent
+from agents.telemetry import Telemetry, run_telemetry
+from db.clickhouse import ClickHouseClient
+from pipeline import (
+    PROFILE_CONCURRENCY,
+    PipelineEvent,
+    ValidationPipeline,
+    print_event,
+    to_sse,
+)
+
+MAX_ACTIVE = 4
+MAX_QUEUED = 16
+MAX_BODY = 64 * 1024
+MAX_HEADER_LINES = 100
+
+REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    503: 'Service Unavailable',
+}
+
+EVENT_ADAPTER = TypeAdapter(Annotated[PipelineEvent, Field(discriminator='type')])
+
+
+class ValidateRequest(BaseModel):
+    projectDescription: str = Field(min_length=1)
+    timeout: Optional[float] = Field(default=None, gt=0)
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+async def read_request(
+    reader: asyncio.StreamReader,
+) -> Tuple[str, str, Dict[str, str], bytes]:
+    request_line = (await reader.readline()).decode('latin-1').strip()
+    parts = request_line.split()
+    if len(parts) != 3:
+        raise HTTPError(400, 'Malformed request line')
+    method, path, _ = parts
+
+    headers = {}
+    for _ in range(MAX_HEADER_LINES):
+        line = (await reader.readline()).decode('latin-1').strip()
+        if not line:
+            break
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    else:
+        raise HTTPError(400, 'Too many headers')
+
+    try:
+        length = int(headers.get('content-length') or 0)
+    except ValueError:
+        raise HTTPError(400, 'Malformed Content-Length') from None
+    if length < 0:
+        raise HTTPError(400, 'Malformed Content-Length')
+    if length > MAX_BODY:
+        raise HTTPError(413, 'Request body too large')
+    body = await reader.readexactly(length) if length else b''
+    return method, path.split('?', 1)[0], headers, body
+
+
+def response_head(
+    status: int, content_type: str, extra: Optional[Dict[str, str]] = None
+) -> bytes:
+    lines = [
+        f'HTTP/1.1 {status} {REASONS.get(status, "")}',
+        f'Content-Type: {content_type}',
+        'Connection: close',
+    ]
+    lines += [f'{name}: {value}' for name, value in (extra or {}).items()]
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode()
+
+
+async def send_json(
+    writer: asyncio.StreamWriter,
+    status: int,
+    payload,
+    extra: Optional[Dict[str, str]] = None,
+) -> None:
+    body = json.dumps(payload).encode()
+    writer.write(
+        response_head(
+            status,
+            'application/json',
+            {'Content-Length': str(len(body)), **(extra or {})},
+        )
+        + body
+    )
+    await writer.drain()
+
+
+class ValidationService:
+    """
+    Serves validations from one warm ValidationPipeline.
+    At most max_active validations run at once and up to max_queued wait
+    for a slot; anything beyond that is turned away immediately.
+    """
+
+    def __init__(
+        self,
+        pipeline: ValidationPipeline,
+        max_active: int = MAX_ACTIVE,
+        max_queued: int = MAX_QUEUED,
+        default_timeout: Optional[float] = None,
+    ):
+        self.pipeline = pipeline
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self.default_timeout = default_timeout
+        self.active = 0
+        self.queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._slots = asyncio.Semaphore(max_active)
+
+    def health(self) -> Dict:
+        return {
+            'active': self.active,
+            'queued': self.queued,
+            'maxActive': self.max_active,
+            'maxQueued': self.max_queued,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+        }
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            method, path, _, body = await read_request(reader)
+            if path == '/health' and method == 'GET':
+                await send_json(writer, 200, self.health())
+            elif path == '/usage' and method == 'GET':
+                stages = self.pipeline.telemetry.stages
+                await send_json(
+                    writer, 200, {k: v.model_dump() for k, v in stages.items()}
+                )
+            elif path == '/validate':
+                if method != 'POST':
+                    raise HTTPError(405, 'Use POST')
+                await self.validate(writer, body)
+            else:
+                raise HTTPError(404, f'No route for {path}')
+        except HTTPError as e:
+            await send_json(writer, e.status, {'error': str(e)})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            print(f'Error handling request: {e}')
+        finally:
+            writer.close()
+
+    async def validate(self, writer: asyncio.StreamWriter, body: bytes) -> None:
+        try:
+            request = ValidateRequest.model_validate_json(body)
+        except ValidationError as e:
+            raise HTTPError(400, str(e)) from e
+
+        if self.active + self.queued >= self.max_active + self.max_queued:
+            self.rejected += 1
+            await send_json(
+                writer,
+                503,
+                {'error': 'Too many validations in progress'},
+                {'Retry-After': '5'},
+            )
+            return
+
+        self.queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+        self.active += 1
+        try:
+            await self._stream(writer, request)
+        finally:
+            self.active -= 1
+            self._slots.release()
+
+    async def _stream(
+        self, writer: asyncio.StreamWriter, request: ValidateRequest
+    ) -> None:
+        # This task's context (and the worker threads it starts) reports here
+        telemetry = Telemetry()
+        run_telemetry.set(telemetry)
+
+        writer.write(
+            response_head(200, 'text/event-stream', {'Cache-Control': 'no-cache'})
+        )
+        events = self.pipeline.run(
+            request.projectDescription, request.timeout or self.default_timeout
+        )
+        failed = False
+        try:
+            async for event in events:
+                writer.write(to_sse(event).encode())
+                # Stops the run if the client has gone away
+                await writer.drain()
+        except ConnectionError:
+            raise
+        except Exception as e:
+            # The stream is already open, so the client learns of it in-band
+            print(f'Error running validation: {e}')
+            failed = True
+            error = json.dumps({'error': str(e) or type(e).__name__})
+            writer.write(f'event: error\ndata: {error}\n\n'.encode())
+        finally:
+            # Returns once the run's worker threads are done with their
+            # current call, so the slot is only freed when the work stops
+            await events.aclose()
+
+        usage = {k: v.model_dump() for k, v in telemetry.stages.items()}
+        writer.write(f'event: usage\ndata: {json.dumps(usage)}\n\n'.encode())
+        await writer.drain()
+        if failed:
+            self.failed += 1
+        else:
+            self.completed += 1
+
+
+async def serve(
+    host: str,
+    port: int,
+    max_active: int = MAX_ACTIVE,
+    max_queued: int = MAX_QUEUED,
+    default_timeout: Optional[float] = None,
+) -> None:
+    # Every active validation profiles up to PROFILE_CONCURRENCY users at once
+    # plus its own stage thread; size the default executor so they all fit
+    callers = max_active * (PROFILE_CONCURRENCY + 2)
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(callers))
+
+    clickhouse = ClickHouseClient() if os.getenv('CLICKHOUSE_URL') else None
+    # Each of those threads may have an attempt and its hedge in flight
+    pipeline = ValidationPipeline(
+        scout=ScoutAgent(clickhouse), llm=LLMClient(max_workers=2 * callers)
+    )
+    service = ValidationService(pipeline, max_active, max_queued, default_timeout)
+
+    server = await asyncio.start_server(service.handle, host, port)
+    print(f'Serving validations on http://{host}:{port}')
+    async with server:
+        await server.serve_forever()
+
+
+class ServiceClient:
+    """
+    Minimal client for a running service, used for local testing.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 8000):
+        self.host = host
+        self.port = port
+
+    async def _request(
+        self, method: str, path: str, payload=None
+    ) -> Tuple[int, asyncio.StreamReader, asyncio.StreamWriter]:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload).encode() if payload is not None else b''
+        writer.write(
+            (
+                f'{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n'
+                f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n'
+            ).encode()
+            + body
+        )
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        while (await reader.readline()).strip():
+            pass
+        return status, reader, writer
+
+    async def get(self, path: str) -> Tuple[int, Dict]:
+        status, reader, writer = await self._request('GET', path)
+        body = await reader.read()
+        writer.close()
+        return status, json.loads(body)
+
+    async def validate(
+        self, project_description: str, timeout: Optional[float] = None
+    ) -> AsyncIterator:
+        """
+        Yields pipeline events, then the run's usage as a dict; a run that
+        failed part-way yields an {'error': message} dict before its usage.
+        Raises HTTPError when the service rejects the request.
+        """
+        status, reader, writer = await self._request(
+            'POST',
+            '/validate',
+            {'projectDescription': project_description, 'timeout': timeout},
+        )
+        try:
+            if status != 200:
+                raise HTTPError(status, json.loads(await reader.read())['error'])
+
+            name, data = None, []
+            while line := await reader.readline():
+                line = line.decode().rstrip('\r\n')
+                if line.startswith('event: '):
+                    name = line[len('event: ') :]
+                elif line.startswith('data: '):
+                    data.append(line[len('data: ') :])
+                elif not line and data:
+                    payload = '\n'.join(data)
+                    if name in ('usage', 'error'):
+                        yield json.loads(payload)
+                    else:
+                        yield EVENT_ADAPTER.validate_json(payload)
+                    name, data = None, []
+        finally:
+            writer.close()
+
+
+async def run_client(host: str, port: int, descriptions: List[str]) -> None:
+    client = ServiceClient(host, port)
+
+    async def one(description: str) -> None:
+        try:
+            async for event in client.validate(description):
+                if isinstance(event, dict) and 'error' in event:
+                    print(f'\nValidation failed: {event["error"]}')
+                elif isinstance(event, dict):
+                    print(f'\nLLM usage: {json.dumps(event)}')
+                else:
+                    print_event(event)
+        except HTTPError as e:
+            print(f'Error validating "{description[:40]}": {e.status} {e}')
+
+    await asyncio.gather(*(one(d) for d in descriptions))
+    print(json.dumps((await client.get('/health'))[1]))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='CrowdProof validation service')
+    parser.add_argument('command', choices=['serve', 'validate', 'health'])
+    parser.add_argument('descriptions', nargs='*')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max-active', type=int, default=MAX_ACTIVE)
+    parser.add_argument('--max-queued', type=int, default=MAX_QUEUED)
+    parser.add_argument('--timeout', type=float)
+    args = parser.parse_args(argv)
+    load_dotenv()
+
+    if args.command == 'serve':
+        asyncio.run(
+            serve(args.host, args.port, args.max_active, args.max_queued, args.timeout)
+        )
+    elif args.command == 'health':
+        _, health = asyncio.run(ServiceClient(args.host, args.port).get('/health'))
+        print(json.dumps(health))
+    else:
+        asyncio.run(run_client(args.host, args.port, args.descriptions))
+
+
+if __name__ == '__main__':
+    main()
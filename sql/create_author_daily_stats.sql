@@ -0,0 +1,41 @@
+-- Per-author, per-subreddit, per-day activity rollup of comments, read by the
+-- author quality filter instead of the comments themselves. Keyed by author,
+-- so an author's whole history is a primary key range. Comment timestamps
+-- keep only each author's first 500 per day; merged, they give the first 500
+-- of any window.
+CREATE TABLE author_daily_stats (
+    author String,
+    subreddit String,
+    day Date,
+    first_seen SimpleAggregateFunction(min, DateTime),
+    comments SimpleAggregateFunction(sum, UInt64),
+    karma SimpleAggregateFunction(sum, Int64),
+    distinguished SimpleAggregateFunction(sum, UInt64),
+    controversial SimpleAggregateFunction(sum, UInt64),
+    timestamps AggregateFunction(groupArraySorted(500), Int64),
+    length_buckets AggregateFunction(entropy, UInt64),
+    bodies AggregateFunction(uniq, UInt64)
+) ENGINE = AggregatingMergeTree()
+PARTITION BY toYYYYMM(day)
+ORDER BY (author, subreddit, day);
+
+CREATE MATERIALIZED VIEW author_daily_stats_mv TO author_daily_stats AS
+SELECT
+    author,
+    subreddit,
+    toDate(created_utc) AS day,
+    min(created_utc) AS first_seen,
+    count() AS comments,
+    sum(score) AS karma,
+    countIf(distinguished IS NOT NULL) AS distinguished,
+    countIf(controversiality > 0) AS controversial,
+    groupArraySortedState(500)(toInt64(toUnixTimestamp(created_utc))) AS timestamps,
+    entropyState(toUInt64(intDiv(length(body), 20))) AS length_buckets,
+    uniqState(cityHash64(lower(body))) AS bodies
+FROM comments
+WHERE author != '[deleted]'
+GROUP BY author, subreddit, day;
+
+-- Backfill for data loaded before the view existed (sql/migrations/004 does
+-- this one partition at a time):
+-- INSERT INTO author_daily_stats SELECT author, subreddit, toDate(created_utc) AS day, min(created_utc), count(), sum(score), countIf(distinguished IS NOT NULL), countIf(controversiality > 0), groupArraySortedState(500)(toInt64(toUnixTimestamp(created_utc))), entropyState(toUInt64(intDiv(length(body), 20))), uniqState(cityHash64(lower(body))) FROM comments WHERE author != '[deleted]' GROUP BY author, subreddit, day;
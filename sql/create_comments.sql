@@ -8,7 +8,10 @@ CREATE TABLE comments (
     score Int64,
     controversiality Int8,
     distinguished Nullable(String),
-    subreddit String
+    subreddit String,
+    INDEX body_ngrams lower(body) TYPE ngrambf_v1(4, 65536, 3, 0) GRANULARITY 1
 ) ENGINE = MergeTree()
 PARTITION BY toYYYYMM(created_utc)
-ORDER BY (subreddit, link_id, created_utc, id);
+ORDER BY (subreddit, cityHash64(link_id), created_utc, id)
+SAMPLE BY cityHash64(link_id)
+SETTINGS non_replicated_deduplication_window = 1000;
@@ -14,7 +14,10 @@ CREATE TABLE submissions (
     subreddit_subscribers Int64,
     view_count Nullable(Int64),
     distinguished Nullable(String),
-    subreddit String
+    subreddit String,
+    INDEX title_ngrams lower(title) TYPE ngrambf_v1(4, 16384, 3, 0) GRANULARITY 1
 ) ENGINE = MergeTree()
 PARTITION BY toYYYYMM(created_utc)
-ORDER BY (subreddit, created_utc, id);
+ORDER BY (subreddit, cityHash64(id), created_utc)
+SAMPLE BY cityHash64(id)
+SETTINGS non_replicated_deduplication_window = 1000;
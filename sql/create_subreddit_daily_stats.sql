@@ -0,0 +1,38 @@
+-- Per-subreddit, per-day activity rollup fed by both source tables.
+-- Unique authors are kept as uniq states so days and sources merge correctly.
+CREATE TABLE subreddit_daily_stats (
+    subreddit String,
+    day Date,
+    active_users AggregateFunction(uniq, String),
+    posts SimpleAggregateFunction(sum, UInt64),
+    comments SimpleAggregateFunction(sum, UInt64),
+    subscribers SimpleAggregateFunction(max, Int64)
+) ENGINE = AggregatingMergeTree()
+PARTITION BY toYYYYMM(day)
+ORDER BY (subreddit, day);
+
+CREATE MATERIALIZED VIEW subreddit_daily_stats_submissions_mv TO subreddit_daily_stats AS
+SELECT
+    subreddit,
+    toDate(created_utc) AS day,
+    uniqStateIf(author, author != '[deleted]') AS active_users,
+    count() AS posts,
+    toUInt64(0) AS comments,
+    max(subreddit_subscribers) AS subscribers
+FROM submissions
+GROUP BY subreddit, day;
+
+CREATE MATERIALIZED VIEW subreddit_daily_stats_comments_mv TO subreddit_daily_stats AS
+SELECT
+    subreddit,
+    toDate(created_utc) AS day,
+    uniqStateIf(author, author != '[deleted]') AS active_users,
+    toUInt64(0) AS posts,
+    count() AS comments,
+    toInt64(0) AS subscribers
+FROM comments
+GROUP BY subreddit, day;
+
+-- Backfill for data loaded before the views existed:
+-- INSERT INTO subreddit_daily_stats SELECT subreddit, toDate(created_utc) AS day, uniqStateIf(author, author != '[deleted]'), count(), toUInt64(0), max(subreddit_subscribers) FROM submissions GROUP BY subreddit, day;
+-- INSERT INTO subreddit_daily_stats SELECT subreddit, toDate(created_utc) AS day, uniqStateIf(author, author != '[deleted]'), toUInt64(0), count(), toInt64(0) FROM comments GROUP BY subreddit, day;
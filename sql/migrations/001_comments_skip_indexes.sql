@@ -0,0 +1,31 @@
+-- Adds an n-gram bloom filter skip index on body (serving the keyword
+-- filters' multiSearchAny) and a sampling key by thread. Changing the sorting
+-- key means rewriting the table: the data is copied into a new table one
+-- monthly partition at a time (see db/migrate.py), checked row for row, and
+-- swapped in atomically. Materialized views reading from `comments` follow
+-- the name and keep working. Pause ingestion while this runs; an interrupted
+-- run resumes from the last copied partition. The previous table is kept as
+-- comments_pre_001 until it is dropped by hand.
+
+CREATE TABLE IF NOT EXISTS comments_001 (
+    id String,
+    link_id String,
+    parent_id String,
+    author String,
+    created_utc DateTime,
+    body String,
+    score Int64,
+    controversiality Int8,
+    distinguished Nullable(String),
+    subreddit String,
+    INDEX body_ngrams lower(body) TYPE ngrambf_v1(4, 65536, 3, 0) GRANULARITY 1
+) ENGINE = MergeTree()
+PARTITION BY toYYYYMM(created_utc)
+ORDER BY (subreddit, cityHash64(link_id), created_utc, id)
+SAMPLE BY cityHash64(link_id);
+
+COPY PARTITIONS FROM comments TO comments_001;
+
+EXCHANGE TABLES comments AND comments_001;
+
+RENAME TABLE comments_001 TO comments_pre_001;
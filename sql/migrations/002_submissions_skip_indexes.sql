@@ -0,0 +1,32 @@
+-- Adds an n-gram bloom filter skip index on title and a sampling key by
+-- submission. Same copy-and-swap procedure as 001; the previous table is
+-- kept as submissions_pre_002 until it is dropped by hand.
+
+CREATE TABLE IF NOT EXISTS submissions_002 (
+    id String,
+    name String,
+    author String,
+    created_utc DateTime,
+    title String,
+    selftext String,
+    url String,
+    domain String,
+    url_overridden_by_dest String,
+    score Int64,
+    upvote_ratio Float32,
+    num_comments Int64,
+    subreddit_subscribers Int64,
+    view_count Nullable(Int64),
+    distinguished Nullable(String),
+    subreddit String,
+    INDEX title_ngrams lower(title) TYPE ngrambf_v1(4, 16384, 3, 0) GRANULARITY 1
+) ENGINE = MergeTree()
+PARTITION BY toYYYYMM(created_utc)
+ORDER BY (subreddit, cityHash64(id), created_utc)
+SAMPLE BY cityHash64(id);
+
+COPY PARTITIONS FROM submissions TO submissions_002;
+
+EXCHANGE TABLES submissions AND submissions_002;
+
+RENAME TABLE submissions_002 TO submissions_pre_002;
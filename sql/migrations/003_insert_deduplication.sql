@@ -0,0 +1,7 @@
+-- Keeps the hashes of the last 1000 inserted blocks, so an insert retried
+-- with the same insert_deduplication_token (the dump loader's batches) is
+-- dropped instead of loaded twice.
+
+ALTER TABLE comments MODIFY SETTING non_replicated_deduplication_window = 1000;
+
+ALTER TABLE submissions MODIFY SETTING non_replicated_deduplication_window = 1000;
@@ -0,0 +1,55 @@
+-- Adds the author_daily_stats rollup (sql/create_author_daily_stats.sql) that
+-- the author quality filter reads instead of scanning comments. The view is
+-- created first, then the rollup is refilled from comments one monthly
+-- partition at a time (see db/migrate.py). Pause ingestion while this runs;
+-- an interrupted run resumes from the last filled partition.
+
+CREATE TABLE IF NOT EXISTS author_daily_stats (
+    author String,
+    subreddit String,
+    day Date,
+    first_seen SimpleAggregateFunction(min, DateTime),
+    comments SimpleAggregateFunction(sum, UInt64),
+    karma SimpleAggregateFunction(sum, Int64),
+    distinguished SimpleAggregateFunction(sum, UInt64),
+    controversial SimpleAggregateFunction(sum, UInt64),
+    timestamps AggregateFunction(groupArraySorted(500), Int64),
+    length_buckets AggregateFunction(entropy, UInt64),
+    bodies AggregateFunction(uniq, UInt64)
+) ENGINE = AggregatingMergeTree()
+PARTITION BY toYYYYMM(day)
+ORDER BY (author, subreddit, day);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS author_daily_stats_mv TO author_daily_stats AS
+SELECT
+    author,
+    subreddit,
+    toDate(created_utc) AS day,
+    min(created_utc) AS first_seen,
+    count() AS comments,
+    sum(score) AS karma,
+    countIf(distinguished IS NOT NULL) AS distinguished,
+    countIf(controversiality > 0) AS controversial,
+    groupArraySortedState(500)(toInt64(toUnixTimestamp(created_utc))) AS timestamps,
+    entropyState(toUInt64(intDiv(length(body), 20))) AS length_buckets,
+    uniqState(cityHash64(lower(body))) AS bodies
+FROM comments
+WHERE author != '[deleted]'
+GROUP BY author, subreddit, day;
+
+BACKFILL PARTITIONS FROM comments TO author_daily_stats AS
+SELECT
+    author,
+    subreddit,
+    toDate(created_utc) AS day,
+    min(created_utc),
+    count(),
+    sum(score),
+    countIf(distinguished IS NOT NULL),
+    countIf(controversiality > 0),
+    groupArraySortedState(500)(toInt64(toUnixTimestamp(created_utc))),
+    entropyState(toUInt64(intDiv(length(body), 20))),
+    uniqState(cityHash64(lower(body)))
+FROM comments
+WHERE _partition_id = {partition} AND author != '[deleted]'
+GROUP BY author, subreddit, day;